@@ -1,29 +1,42 @@
 import sys
 import os
-import re
-import copy
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 from license_manager_secure import check_license, activate_app, get_machine_code
-from io import StringIO
+from data_loader import load_data_file, describe_file, SharedStores, LoadCancelled, LOADER_VERSION
+from data_cache import ParsedDataCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MB
+from data_store import LoadedFile
+from session import save_session, load_session, is_session_dir, SESSION_EXT
+from tail_follow import FileFollower, DEFAULT_FOLLOW_MS, can_follow
+from memory_manager import MemoryManager, DEFAULT_MEMORY_MB
+from pipeline import CenterStep, NormalizeStep, BackgroundStep, MaskStep
+from edit_history import (EditHistory, AddStepsEdit, DeleteEdit, RemoveStepEdit,
+                          StepParamsEdit, DEFAULT_HISTORY_MB)
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QWidget,
     QVBoxLayout, QHBoxLayout, QPushButton, QComboBox,
     QDialog, QTableWidget, QTableWidgetItem, QLabel, QToolBar,
-    QMessageBox, QLineEdit
+    QMessageBox, QLineEdit, QProgressDialog, QFormLayout, QCheckBox, QSpinBox, QDockWidget
 )
 from PySide6.QtGui import QAction, QPixmap
-from PySide6.QtCore import QSize, Qt
+from PySide6.QtCore import QSize, Qt, QTimer, QSettings, QObject
 import matplotlib
 matplotlib.use('QtAgg')
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
+from matplotlib.lines import Line2D
 
 # 最小化的启动时 rcParams 设置（仅必需项，加快启动）
 plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Arial Unicode MS']
 plt.rcParams['axes.unicode_minus'] = False
 
+# 批量导入时的解析线程数
+INGEST_WORKERS = min(4, os.cpu_count() or 1)
+
 # 延迟加载的样式初始化标志
 _mpl_style_initialized = False
 
@@ -97,6 +110,22 @@ QComboBox QAbstractItemView::item:selected, QListView::item:selected {
 }
 """
 
+def format_size(nbytes):
+    """字节数的显示文本，如 1.5 MB"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024 or unit == 'GB':
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+def list_folder_files(folder):
+    """文件夹（含子文件夹）中的数据文件，按路径排序；跳过隐藏文件、隐藏目录和会话目录"""
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs
+                         if not d.startswith('.') and not is_session_dir(os.path.join(root, d)))
+        paths.extend(os.path.join(root, f) for f in sorted(files) if not f.startswith('.'))
+    return paths
+
 def latex_to_unicode(name):
     replacements = {
         r'\theta': '\u03B8',   # θ
@@ -122,6 +151,14 @@ class SquareFigureCanvas(FigureCanvas):
         size_policy.setHeightForWidth(True)
         self.setSizePolicy(size_policy)
     
+    def draw_idle(self, *args, **kwargs):
+        """设置了渲染调度器时，把空闲重绘请求交给调度器统一合并"""
+        scheduler = getattr(self, 'render_scheduler', None)
+        if scheduler is not None:
+            scheduler.request('full')
+        else:
+            super().draw_idle(*args, **kwargs)
+
     def hasHeightForWidth(self):
         """告诉布局系统这个控件的高度依赖于宽度"""
         return True
@@ -146,6 +183,69 @@ class SquareFigureCanvas(FigureCanvas):
         except Exception:
             return super().minimumSizeHint()
 
+class RenderScheduler(QObject):
+    """
+    渲染调度器：各处理函数只提交"需要重绘"的请求，同一帧内的请求合并为一次渲染
+
+    请求类型（优先级从高到低）：
+        'lod'     - 视图范围变化，先重新计算降采样包络再完整重绘
+        'full'    - 完整重绘
+        'pan'     - 右键平移预览（平移缓存的像素）
+        'tail'    - 跟随模式：把新追加的曲线段画到缓存的背景上
+        'overlay' - 只 blit 叠加层（选择框、高亮点、十字线）
+    """
+    FRAME_MS = 16
+
+    def __init__(self, render_fn, parent=None):
+        super().__init__(parent)
+        self._render_fn = render_fn
+        self._pending = set()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._render_frame)
+        self._last_frame_end = 0.0
+        self.frames = 0
+        self.requests = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+        self.frame_callback = None  # 每帧渲染后调用，参数为 stats()
+
+    def request(self, kind='full'):
+        self.requests += 1
+        self._pending.add(kind)
+        if not self._timer.isActive():
+            # 距上一帧不足一帧时间时推迟到下一帧
+            elapsed = (time.perf_counter() - self._last_frame_end) * 1000
+            self._timer.start(max(0, int(self.FRAME_MS - elapsed)))
+
+    def _render_frame(self):
+        pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        t0 = time.perf_counter()
+        try:
+            self._render_fn(pending)
+        finally:
+            t1 = time.perf_counter()
+            self._last_frame_end = t1
+            self.last_ms = (t1 - t0) * 1000
+            self.max_ms = max(self.max_ms, self.last_ms)
+            self.avg_ms = self.last_ms if self.frames == 0 else 0.9 * self.avg_ms + 0.1 * self.last_ms
+            self.frames += 1
+            if self.frame_callback is not None:
+                self.frame_callback(self.stats())
+
+    def stats(self):
+        """调试统计：帧数、请求数及每帧渲染耗时（毫秒）"""
+        return {
+            'frames': self.frames,
+            'requests': self.requests,
+            'last_ms': round(self.last_ms, 2),
+            'avg_ms': round(self.avg_ms, 2),
+            'max_ms': round(self.max_ms, 2),
+        }
+
 class PlotApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -191,8 +291,8 @@ class PlotApp(QMainWindow):
         )
         
         self.setAcceptDrops(True)
-        self.history = []  # 保存每次操作前的 loaded_files 状态，用于撤回
-        self.max_history = 10  # 最多保存 10 步历史
+        # 撤回/重做历史：只记录对处理流程的修改（增删步骤、修改参数、删除点），按内存预算限制长度
+        self.history = EditHistory()
         self.dragging = False
         self.last_mouse_pos = None
         # 矩形选择相关
@@ -200,6 +300,52 @@ class PlotApp(QMainWindow):
         self._rect_start = None  # (xdata, ydata)
         self._mouse_press_pix = None  # (xpix, ypix)
         self._is_selecting = False
+        # 交互叠加层：选择框、高亮点和十字线使用 animated 艺术家，只在缓存的背景上 blit
+        self._highlight = None
+        self._crosshair = None  # (竖线, 横线)
+        self._blit_bg = None  # 最近一次完整绘制后的画布背景
+        self._pan_start_bg = None  # 右键平移开始时的背景，用于平移过程中的平移预览
+        self._pan_origin = None  # 右键按下时的像素位置
+        self._pan_offset = (0, 0)  # 平移累计的像素偏移 (右, 下)
+        # 每个已加载文件的曲线：[Line2D, 完整 x, 完整 y, 行位置]（无对应列时为 None），
+        # 以及上次计算包络时的 (x0, x1, 像素列数)
+        self._lod_lines = []
+        self._lod_xlim = None
+        # 坐标轴是否已初始化；当前曲线对应的列、图例条目和布局依据，用于跳过不必要的重建
+        self._axes_ready = False
+        self._plot_cols = None
+        self._legend_key = None
+        self._layout_key = None
+        # 最近点拾取的网格索引；数据版本号在每次更新曲线数据时递增，用于判断索引是否过期
+        self._data_version = 0
+        self._pick_index = None
+        self._pick_key = None
+        # 正在进行的批量导入任务与会话保存任务（None 表示空闲）
+        self._ingest = None
+        self._session_save = None
+        # 用户设置与解析结果缓存
+        self.settings = QSettings("InstPlot", "InstPlot")
+        self.data_cache = None
+        self._apply_cache_settings()
+        self.history.set_budget(self.settings.value("history/budget_mb", DEFAULT_HISTORY_MB, type=int) * 1024 * 1024)
+        # 内容相同的文件共用同一组列存储，只解析一次
+        self.shared_stores = SharedStores()
+        # 已加载数据的内存预算：超出时把最久未绘制的文件换出为内存映射
+        self.memory = MemoryManager(self.settings.value("memory/budget_mb", DEFAULT_MEMORY_MB, type=int) * 1024 * 1024)
+        # 跟随模式：LoadedFile -> FileFollower，定时读取仍在写入的文件新追加的行
+        self._followers = {}
+        self._tail_segments = []  # 等待 blit 的新曲线段
+        self._follow_timer = QTimer(self)
+        self._follow_timer.setInterval(self.settings.value("follow/interval_ms", DEFAULT_FOLLOW_MS, type=int))
+        self._follow_timer.timeout.connect(self._poll_followers)
+        # 文件夹导入的文件目录（停靠窗口）：路径 -> 表格中的勾选项；勾选时才解析，
+        # 取消勾选的文件移出 loaded_files 并释放列数据，暂存在 _catalog_parked 中，再次勾选时直接放回
+        self._catalog_dock = None
+        self._catalog_items = {}
+        self._catalog_parked = {}
+        self._catalog_pending = []  # 已勾选、等待导入任务空闲后开始解析的文件
+        self._catalog_loading = set()  # 正在由导入任务解析的文件
+        self._catalog_scan = None  # 正在读取文件头的目录任务
 
         # 状态栏
         self.statusBar().showMessage("拖入数据文件或点击打开文件按钮")
@@ -258,9 +404,23 @@ class PlotApp(QMainWindow):
         # 图标参考：https://github.com/spyder-ide/qtawesome/blob/master/qtawesome/iconic-fonts.md
         # fa5s = FontAwesome 5 Solid, fa5r = FontAwesome 5 Regular
         self.toolbar.addAction(make_action("fa5s.folder-open", "打开文件", self.open_file))
+        self.toolbar.addAction(make_action("fa5s.folder", "导入文件夹", self.open_folder_catalog))
         self.toolbar.addAction(make_action("fa5s.save", "导出数据", self.export_data))
+        self.toolbar.addAction(make_action("fa5s.briefcase", "保存会话", self.save_session_dialog))
+        self.toolbar.addAction(make_action("fa5s.box-open", "打开会话", self.open_session_dialog))
         self.toolbar.addAction(make_action("fa5s.image", "保存图片", self.save_figure))
-        self.toolbar.addAction(make_action("fa5s.undo", "撤回", self.undo))
+        self.action_undo = make_action("fa5s.undo", "撤回", self.undo)
+        self.action_redo = make_action("fa5s.redo", "重做", self.redo)
+        self.toolbar.addAction(self.action_undo)
+        self.toolbar.addAction(self.action_redo)
+        # 没有可撤回/重做的操作时禁用对应按钮
+        self.history.changed_callback = self._update_history_actions
+        self._update_history_actions()
+        self.toolbar.addAction(make_action("fa5s.compress", "压缩数据", self.compact_data))
+        self.toolbar.addAction(make_action("fa5s.list-ol", "处理流程", self.open_pipeline))
+        self.toolbar.addAction(make_action("fa5s.eye", "跟随文件", self.open_follow_dialog))
+        self.toolbar.addAction(make_action("fa5s.memory", "内存", self.open_memory_view))
+        self.toolbar.addAction(make_action("fa5s.cog", "设置", self.open_settings))
         self.toolbar.addSeparator()
         # 主题（仅浅色），不提供深色切换
 
@@ -275,6 +435,15 @@ class PlotApp(QMainWindow):
         self.canvas.mpl_connect("button_release_event", self.on_mouse_release)
         self.canvas.mpl_connect("motion_notify_event", self.on_mouse_drag)
         self.canvas.mpl_connect("scroll_event", self.on_scroll)
+        self.canvas.mpl_connect("draw_event", self._on_canvas_draw)
+        # 所有重绘请求都经由调度器合并，每帧最多渲染一次
+        self.render_scheduler = RenderScheduler(self._render_frame, self)
+        self.canvas.render_scheduler = self.render_scheduler
+        # 设置环境变量 INSTPLOT_DEBUG 时在状态栏显示每帧渲染耗时
+        if os.environ.get("INSTPLOT_DEBUG"):
+            self.render_stats_label = QLabel()
+            self.statusBar().addPermanentWidget(self.render_stats_label)
+            self.render_scheduler.frame_callback = self._show_render_stats
 
         # =============== 下拉菜单和绘制按钮 ===============
         self.btn_center = QPushButton("对称处理")
@@ -342,7 +511,7 @@ class PlotApp(QMainWindow):
         self.btn_plot.clicked.connect(self.plot_selected)
 
         # 数据存储
-        self.loaded_files = []  # 存储 (file_path, df)
+        self.loaded_files = []  # 存储 LoadedFile（文件路径、列存储及处理流程）
         self.col_unicode_map = {}
         self.last_x_col = ""
         self.last_y_col = ""
@@ -406,6 +575,40 @@ class PlotApp(QMainWindow):
             self._update_button_styles()
         except Exception:
             pass
+        # 绘图区宽度变化后需要按新的像素列数重新计算包络
+        self._request_render('lod')
+
+    # =============== 渲染调度 ===============
+    def _request_render(self, kind='full'):
+        scheduler = getattr(self, 'render_scheduler', None)
+        if scheduler is not None:
+            scheduler.request(kind)
+
+    def _render_frame(self, pending):
+        """执行一帧渲染：完整重绘会覆盖平移预览和叠加层"""
+        if 'lod' in pending:
+            self._update_lod()
+            # 包络算完后再检查内存预算，换出的文件不会在这一帧内又被读回
+            self._enforce_memory()
+        if 'lod' in pending or 'full' in pending:
+            # draw_event 回调会缓存背景并画出叠加层；新曲线段已包含在完整的曲线中
+            self._tail_segments = []
+            self.canvas.draw()
+        elif 'pan' in pending:
+            self._pan_preview()
+        elif 'tail' in pending:
+            self._blit_tail_now()
+        elif 'overlay' in pending:
+            self._blit_overlay_now()
+
+    def _show_render_stats(self, stats):
+        self.render_stats_label.setText(
+            f"渲染 {stats['last_ms']:.1f} ms (平均 {stats['avg_ms']:.1f}, 最大 {stats['max_ms']:.1f}, "
+            f"{stats['frames']} 帧 / {stats['requests']} 次请求)")
+
+    def render_stats(self):
+        """渲染调度器的调试统计"""
+        return self.render_scheduler.stats()
 
     def _calculate_scaled_font_size(self, base_size):
         """根据屏幕 DPI 计算缩放后的字体大小（单位：pt）"""
@@ -427,6 +630,140 @@ class PlotApp(QMainWindow):
             self.statusBar().showMessage(f"x={x:.4g}, y={y:.4g}")
         else:
             self.statusBar().clearMessage()
+        if not self.dragging:
+            self._update_crosshair(event)
+
+    # =============== 交互叠加层（blit） ===============
+    def _on_canvas_draw(self, event):
+        """每次完整绘制后缓存背景，并把叠加层画在上面；导出图片时的绘制（分辨率不同）不处理"""
+        if self.canvas.is_saving():
+            return
+        self._blit_bg = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_overlays()
+
+    def _overlay_artists(self):
+        artists = [self._rect_selector, self._highlight]
+        if self._crosshair is not None:
+            artists.extend(self._crosshair)
+        return [a for a in artists if a is not None and a.axes is self.ax]
+
+    def _draw_overlays(self):
+        for artist in self._overlay_artists():
+            if artist.get_visible():
+                self.ax.draw_artist(artist)
+
+    def _blit_overlay(self):
+        self._request_render('overlay')
+
+    def _export_figure(self, fname, **kwargs):
+        """导出图片：保存时 matplotlib 也会绘制 animated 的叠加层，先隐藏，保存后恢复"""
+        hidden = [a for a in self._overlay_artists() if a.get_visible()]
+        for artist in hidden:
+            artist.set_visible(False)
+        try:
+            self.canvas.figure.savefig(fname, **kwargs)
+        finally:
+            for artist in hidden:
+                artist.set_visible(True)
+
+    def _blit_overlay_now(self):
+        """在缓存的背景上只重绘叠加层，不重新渲染曲线"""
+        if self._blit_bg is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._blit_bg)
+        self._draw_overlays()
+        self.canvas.blit(self.ax.bbox)
+
+    def _blit_tail_now(self):
+        """把跟随模式新追加的曲线段画到缓存的背景上，不重新渲染已有曲线"""
+        segments, self._tail_segments = self._tail_segments, []
+        if self._blit_bg is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._blit_bg)
+        for seg in segments:
+            self.ax.draw_artist(seg)
+        # 新曲线段成为背景的一部分，之后的叠加层都画在它上面
+        self._blit_bg = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_overlays()
+        self.canvas.blit(self.ax.bbox)
+
+    def _tail_segment(self, line, xs, ys):
+        """与曲线样式相同的新曲线段（不加入坐标轴，只用于 blit）"""
+        seg = Line2D(xs, ys, color=line.get_color(), linewidth=line.get_linewidth(),
+                     marker=line.get_marker(), markersize=line.get_markersize(),
+                     markeredgewidth=line.get_markeredgewidth(), alpha=line.get_alpha(),
+                     zorder=line.get_zorder(), animated=True)
+        seg.set_figure(self.figure)
+        seg.axes = self.ax
+        seg.set_transform(self.ax.transData)
+        seg.set_clip_path(self.ax.patch)
+        return seg
+
+    def _add_highlight(self, x, y, markersize=8, zorder=10):
+        """添加高亮点（叠加层）"""
+        self._highlight = Line2D([x], [y], marker='o', markersize=markersize, color='red',
+                                 markeredgecolor='black', zorder=zorder, animated=True)
+        self.ax.add_artist(self._highlight)
+
+    def _remove_highlight(self):
+        if self._highlight is not None:
+            try:
+                self._highlight.remove()
+            except Exception:
+                pass
+            self._highlight = None
+
+    def _update_crosshair(self, event):
+        if event.inaxes is not self.ax:
+            if self._crosshair is not None and self._crosshair[0].get_visible():
+                for line in self._crosshair:
+                    line.set_visible(False)
+                self._blit_overlay()
+            return
+        if self._crosshair is None or self._crosshair[0].axes is not self.ax:
+            style = dict(color='#888888', linewidth=0.8, linestyle='--', zorder=9, animated=True)
+            vline = Line2D([0, 0], [0, 1], transform=self.ax.get_xaxis_transform(), **style)
+            hline = Line2D([0, 1], [0, 0], transform=self.ax.get_yaxis_transform(), **style)
+            self.ax.add_artist(vline)
+            self.ax.add_artist(hline)
+            self._crosshair = (vline, hline)
+        vline, hline = self._crosshair
+        vline.set_xdata([event.xdata, event.xdata])
+        hline.set_ydata([event.ydata, event.ydata])
+        vline.set_visible(True)
+        hline.set_visible(True)
+        self._blit_overlay()
+
+    def _pan_preview(self):
+        """平移过程中直接平移缓存的曲线像素，松开右键后再完整重绘"""
+        if self._pan_start_bg is None:
+            self.canvas.draw()
+            return
+        sx, sy = self._pan_offset
+        fig_h = self.figure.bbox.height
+        x0, y0, x1, y1 = self.ax.bbox.extents
+        # 转换为 Agg 缓冲区坐标（原点在左上角）
+        ax1, ay1, ax2, ay2 = int(x0), int(fig_h - y1), int(x1), int(fig_h - y0)
+        self.canvas.restore_region(self._pan_start_bg)
+        self.ax.draw_artist(self.ax.patch)
+        src = (max(ax1, ax1 - sx), max(ay1, ay1 - sy), min(ax2, ax2 - sx), min(ay2, ay2 - sy))
+        if src[2] > src[0] and src[3] > src[1]:
+            self.canvas.restore_region(self._pan_start_bg, bbox=src, xy=(sx, sy))
+        for spine in self.ax.spines.values():
+            self.ax.draw_artist(spine)
+        self.canvas.blit(self.ax.bbox)
+
+    def _get_pick_index(self, tol_pixels):
+        """返回当前视图的拾取索引；数据、视图范围或画布尺寸变化后重新构建"""
+        key = (self._data_version, self.ax.get_xlim(), self.ax.get_ylim(),
+               tuple(self.ax.bbox.extents), tol_pixels)
+        if self._pick_index is None or self._pick_key != key:
+            entries = [(fi,) + self._line_arrays(fi)[:2] for fi, e in enumerate(self._lod_lines) if e is not None]
+            self._pick_index = DisplayGridIndex(self.ax, entries, tol_pixels)
+            self._pick_key = key
+        return self._pick_index
 
     def on_click_point(self, event):
         if event.inaxes is None or event.button != 1:  # 只响应左键
@@ -436,88 +773,42 @@ class PlotApp(QMainWindow):
         print(f"点击坐标: x={x:.3f}, y={y:.3f}")
 
         # 移除上一次高亮点
-        if hasattr(self, "_highlight") and self._highlight is not None:
-            try:
-                self._highlight.remove()
-            except Exception:
-                pass
-            self._highlight = None
+        self._remove_highlight()
         # 在所有已加载的曲线数据中寻找距离点击点最近的点
         nearest = None
-        nearest_dist = None
-        nearest_info = None  # (file_index, idx_in_df, xcol, ycol)
+        nearest_info = None  # (file_index, idx_in_df)
         xcol = self.combo_x.currentText()
         ycol = self.combo_y.currentText()
         if not xcol or not ycol:
             # 如果未选择列，直接显示点击高亮点
-            self._highlight = event.inaxes.plot(
-                x, y, marker='o', markersize=8, color='red', markeredgecolor='black', zorder=10
-            )[0]
-            self.canvas.draw()
+            self._add_highlight(x, y)
+            self._blit_overlay()
             return
 
         # 使用像素坐标比较（更加符合可视上的点击定位），并设置最大像素容限
         tol_pixels = 10  # 容忍范围(px)，可调整
-        event_xpix = getattr(event, 'x', None)
-        event_ypix = getattr(event, 'y', None)
-        if event_xpix is None or event_ypix is None:
-            # 回退到数据坐标方式
-            event_xpix = None
-        for fi, (file_path, df) in enumerate(self.loaded_files):
-            if xcol not in df.columns or ycol not in df.columns:
-                continue
-            xs = pd.to_numeric(df[xcol], errors='coerce')
-            ys = pd.to_numeric(df[ycol], errors='coerce')
-            valid_mask = ~(xs.isna() | ys.isna())
-            if not valid_mask.any():
-                continue
-            xs_v = xs[valid_mask].to_numpy()
-            ys_v = ys[valid_mask].to_numpy()
-            try:
-                if event_xpix is not None:
-                    pts_disp = self.ax.transData.transform(np.column_stack((xs_v, ys_v)))
-                    dx = pts_disp[:, 0] - event_xpix
-                    dy = pts_disp[:, 1] - event_ypix
-                    dists = np.hypot(dx, dy)
-                    min_idx = int(np.argmin(dists))
-                    min_dist_pix = float(dists[min_idx])
-                    if min_dist_pix <= tol_pixels and (nearest_dist is None or min_dist_pix < nearest_dist):
-                        nearest_dist = min_dist_pix
-                        nearest = (xs_v[min_idx], ys_v[min_idx])
-                        orig_indices = df[valid_mask].index.to_numpy()
-                        nearest_info = (fi, int(orig_indices[min_idx]))
-                else:
-                    # 如果没有像素坐标，回退到数据坐标距离
-                    dx = xs_v - x
-                    dy = ys_v - y
-                    dists = np.hypot(dx, dy)
-                    min_idx = int(np.argmin(dists))
-                    min_dist = float(dists[min_idx])
-                    if nearest_dist is None or min_dist < nearest_dist:
-                        nearest_dist = min_dist
-                        nearest = (xs_v[min_idx], ys_v[min_idx])
-                        orig_indices = df[valid_mask].index.to_numpy()
-                        nearest_info = (fi, int(orig_indices[min_idx]))
-            except Exception:
-                continue
+        # 在当前视图的网格索引中查找（索引在数据或视图变化后的首次点击时重建）
+        hit = self._get_pick_index(tol_pixels).query(event.x, event.y, tol_pixels)
+        if hit is not None:
+            fi, pos = hit
+            xs_v, ys_v, rows = self._line_arrays(fi)
+            nearest = (xs_v[pos], ys_v[pos])
+            row = int(rows[pos]) if rows is not None else int(pos)
+            nearest_info = (fi, row)
 
         if nearest is None:
             # 无数据点可选，直接绘制点击点
-            self._highlight = event.inaxes.plot(
-                x, y, marker='o', markersize=8, color='red', markeredgecolor='black', zorder=10
-            )[0]
-            self.canvas.draw()
+            self._add_highlight(x, y)
+            self._blit_overlay()
             return
 
         # 高亮最近点
         hx, hy = nearest
         try:
-            self._highlight = event.inaxes.plot(
-                hx, hy, marker='o', markersize=10, color='red', markeredgecolor='black', zorder=12
-            )[0]
+            self._add_highlight(hx, hy, markersize=10, zorder=12)
         except Exception:
             self._highlight = None
-        self.canvas.draw()
+        self._blit_overlay()
 
         # 弹出确认框
         try:
@@ -527,21 +818,12 @@ class PlotApp(QMainWindow):
             mb.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
             ret = mb.exec()
             if ret == QMessageBox.Yes:
-                # 记录历史以便撤回
-                try:
-                    self.history.append(copy.deepcopy(self.loaded_files))
-                    if len(self.history) > self.max_history:
-                        self.history.pop(0)
-                except Exception:
-                    pass
-                # 从对应 DataFrame 删除该行并重绘
+                # 在处理流程末尾的删除步骤中标记该行并重绘（不修改原始数据）
                 try:
-                    fi, orig_idx = nearest_info
-                    file_path, df = self.loaded_files[fi]
-                    # 删除行
-                    df = df.drop(index=orig_idx).reset_index(drop=True)
-                    # 更新存储
-                    self.loaded_files[fi] = (file_path, df)
+                    fi, row = nearest_info
+                    deleted = self.loaded_files[fi].delete_rows([row])
+                    # 只记录被删除的行位置以便撤回
+                    self.history.push(DeleteEdit("删除点", [(fi, deleted)]))
                     # 删除点后保留当前缩放/平移状态
                     self.replot_all(preserve_view=True)
                     self.statusBar().showMessage(f"已删除点 (x={hx:.4g}, y={hy:.4g})")
@@ -551,10 +833,8 @@ class PlotApp(QMainWindow):
             else:
                 # 如果取消，移除高亮
                 try:
-                    if hasattr(self, '_highlight') and self._highlight is not None:
-                        self._highlight.remove()
-                        self._highlight = None
-                        self.canvas.draw()
+                    self._remove_highlight()
+                    self._blit_overlay()
                 except Exception:
                     pass
         except Exception:
@@ -566,6 +846,9 @@ class PlotApp(QMainWindow):
         if event.button == 3 and event.inaxes:
             self.dragging = True
             self.last_mouse_pos = (event.x, event.y)
+            self._pan_start_bg = self._blit_bg
+            self._pan_origin = (event.x, event.y)
+            self._pan_offset = (0, 0)
             return
 
         # 左键：可能是单击也可能是矩形选择，记录起点（像素与数据坐标）
@@ -583,8 +866,13 @@ class PlotApp(QMainWindow):
     def on_mouse_release(self, event):
         # 结束右键平移
         if event.button == 3:
+            was_panning = self.dragging and self._pan_offset != (0, 0)
             self.dragging = False
             self.last_mouse_pos = None
+            self._pan_start_bg = None
+            if was_panning:
+                # 平移结束后按新的视图范围完整重绘一次
+                self._request_render('lod')
             return
 
         # 左键松开：处理矩形选择结束或单击
@@ -605,6 +893,7 @@ class PlotApp(QMainWindow):
                     pass
                 self._rect_selector = None
                 self._is_selecting = False
+                self._blit_overlay()
 
                 if xmin is None:
                     self._mouse_press_pix = None
@@ -619,20 +908,18 @@ class PlotApp(QMainWindow):
                     self._rect_start = None
                     return
 
+                # 在当前绘制的曲线数据（已排除无效点和已删除点）中查找选区内的点
                 to_delete = {}
                 total_count = 0
-                for fi, (file_path, df) in enumerate(self.loaded_files):
-                    if xcol not in df.columns or ycol not in df.columns:
+                for fi, entry in enumerate(self._lod_lines):
+                    if entry is None:
                         continue
-                    xs = pd.to_numeric(df[xcol], errors='coerce')
-                    ys = pd.to_numeric(df[ycol], errors='coerce')
-                    valid_mask = ~(xs.isna() | ys.isna())
-                    if not valid_mask.any():
-                        continue
-                    sub = df[valid_mask]
-                    mask_in = (sub[xcol] >= xmin) & (sub[xcol] <= xmax) & (sub[ycol] >= ymin) & (sub[ycol] <= ymax)
+                    xs, ys, rows = self._line_arrays(fi)
+                    mask_in = (xs >= xmin) & (xs <= xmax) & (ys >= ymin) & (ys <= ymax)
                     if mask_in.any():
-                        inds = sub[mask_in].index.to_list()
+                        inds = np.flatnonzero(mask_in)
+                        if rows is not None:
+                            inds = rows[inds]
                         to_delete[fi] = inds
                         total_count += len(inds)
 
@@ -640,10 +927,6 @@ class PlotApp(QMainWindow):
                     self.statusBar().showMessage("矩形内未找到数据点")
                     self._mouse_press_pix = None
                     self._rect_start = None
-                    try:
-                        self.canvas.draw()
-                    except Exception:
-                        pass
                     return
 
                 try:
@@ -654,16 +937,9 @@ class PlotApp(QMainWindow):
                     ret = mb.exec()
                     if ret == QMessageBox.Yes:
                         try:
-                            self.history.append(copy.deepcopy(self.loaded_files))
-                            if len(self.history) > self.max_history:
-                                self.history.pop(0)
-                        except Exception:
-                            pass
-                        try:
-                            for fi, inds in to_delete.items():
-                                path, df = self.loaded_files[fi]
-                                df = df.drop(index=inds).reset_index(drop=True)
-                                self.loaded_files[fi] = (path, df)
+                            deleted = [(fi, self.loaded_files[fi].delete_rows(inds))
+                                       for fi, inds in to_delete.items()]
+                            self.history.push(DeleteEdit("批量删除", deleted))
                             # 批量删除后保留当前视图范围
                             self.replot_all(preserve_view=True)
                             self.statusBar().showMessage(f"已删除选区内 {total_count} 个点")
@@ -699,17 +975,21 @@ class PlotApp(QMainWindow):
                 return
             dx = event.x - self.last_mouse_pos[0]
             dy = event.y - self.last_mouse_pos[1]
-            ax = event.inaxes
+            ax = self.ax
             xlim = ax.get_xlim()
             ylim = ax.get_ylim()
             x_range = xlim[1] - xlim[0]
             y_range = ylim[1] - ylim[0]
-            width, height = self.canvas.width(), self.canvas.height()
+            # 按绘图区的像素尺寸换算，使曲线严格跟随鼠标移动
+            width, height = ax.bbox.width, ax.bbox.height
             dx_data = -dx * x_range / width
             dy_data = -dy * y_range / height
             ax.set_xlim(xlim[0] + dx_data, xlim[1] + dx_data)
             ax.set_ylim(ylim[0] + dy_data, ylim[1] + dy_data)
-            self.canvas.draw()
+            # 相对平移起点的总偏移（Agg 缓冲区的 y 轴向下）
+            self._pan_offset = (int(round(event.x - self._pan_origin[0])),
+                                -int(round(event.y - self._pan_origin[1])))
+            self._request_render('pan')
             self.last_mouse_pos = (event.x, event.y)
             return
 
@@ -732,8 +1012,8 @@ class PlotApp(QMainWindow):
                     try:
                         self._rect_selector = Rectangle((xmin, ymin), xmax - xmin, ymax - ymin,
                                                         fill=False, edgecolor='red', linewidth=1.2,
-                                                        linestyle='--', zorder=11)
-                        self.ax.add_patch(self._rect_selector)
+                                                        linestyle='--', zorder=11, animated=True)
+                        self.ax.add_artist(self._rect_selector)
                         self._is_selecting = True
                     except Exception:
                         self._rect_selector = None
@@ -746,7 +1026,7 @@ class PlotApp(QMainWindow):
                     except Exception:
                         pass
                 try:
-                    self.canvas.draw()
+                    self._blit_overlay()
                 except Exception:
                     pass
         except Exception:
@@ -769,7 +1049,8 @@ class PlotApp(QMainWindow):
 
         self.ax.set_xlim([xdata - new_width * relx, xdata + new_width * (1 - relx)])
         self.ax.set_ylim([ydata - new_height * rely, ydata + new_height * (1 - rely)])
-        self.canvas.draw_idle()
+        # 滚轮连续触发时，包络计算和重绘在同一帧内只做一次
+        self._request_render('lod')
     
     # 保存图片
     def save_figure(self):
@@ -781,20 +1062,215 @@ class PlotApp(QMainWindow):
         )
         if fname:
             try:
-                self.canvas.figure.savefig(fname, dpi=600)
+                self._export_figure(fname, dpi=600)
                 self.statusBar().showMessage(f"图片已保存: {fname}")
             except Exception as e:
                 self.statusBar().showMessage(f"保存失败: {e}")
 
-    
+
+    # 保存会话：所有文件的数据、处理流程和当前视图
+    def save_session_dialog(self):
+        if not self.loaded_files:
+            self.statusBar().showMessage("没有可以保存的数据")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "保存会话", "", f"InstPlot 会话 (*{SESSION_EXT})")
+        if not path:
+            return
+        if not path.endswith(SESSION_EXT):
+            path += SESSION_EXT
+        view = {'x_col': self.combo_x.currentText(), 'y_col': self.combo_y.currentText()}
+        if any(e is not None for e in self._lod_lines):
+            view['xlim'] = [float(v) for v in self.ax.get_xlim()]
+            view['ylim'] = [float(v) for v in self.ax.get_ylim()]
+        # 在后台线程中保存：期间禁用界面，暂停跟随和内存预算检查（换出），数据不会在保存过程中被修改
+        pool = ThreadPoolExecutor(max_workers=1)
+        future = pool.submit(save_session, path, list(self.loaded_files), view)
+        pool.shutdown(wait=False)
+        timer = QTimer(self)
+        timer.setInterval(50)
+        self._session_save = {'path': path, 'future': future, 'timer': timer,
+                              'follow': self._follow_timer.isActive()}
+        self._follow_timer.stop()
+        self.setEnabled(False)
+        self.statusBar().showMessage("正在保存会话…")
+        timer.timeout.connect(self._poll_session_save)
+        timer.start()
+
+    def _poll_session_save(self):
+        task = self._session_save
+        if task is None or not task['future'].done():
+            return
+        task['timer'].stop()
+        self._session_save = None
+        self.setEnabled(True)
+        if task['follow']:
+            self._follow_timer.start()
+        # 保存期间暂停了内存预算检查
+        self._enforce_memory()
+        path = task['path']
+        try:
+            task['future'].result()
+            self.statusBar().showMessage(f"会话已保存: {path}")
+        except ValueError as e:
+            # 所选位置已有不是会话的文件夹或文件：不覆盖
+            self.statusBar().showMessage(f"保存会话失败: {e}")
+            QMessageBox.warning(self, "保存会话", str(e))
+        except Exception as e:
+            self.statusBar().showMessage(f"保存会话失败: {e}")
+            print("保存会话错误:", e)
+
+    # 打开会话（选择以 .instplot 结尾的会话目录）
+    def open_session_dialog(self):
+        path = QFileDialog.getExistingDirectory(self, "打开会话（选择 .instplot 目录）")
+        if not path:
+            return
+        if not is_session_dir(path):
+            self.statusBar().showMessage("所选目录不是 InstPlot 会话")
+            return
+        self.restore_session(path)
+
+    def restore_session(self, path):
+        """恢复会话：各列以内存映射方式打开，绘图用到时才读入，处理结果按保存的步骤重新计算"""
+        try:
+            files, view = load_session(path)
+        except Exception as e:
+            self.statusBar().showMessage(f"打开会话失败: {e}")
+            print("打开会话错误:", e)
+            return
+        self.clear_plot()
+        for item in files:
+            self._add_loaded_file(item['path'], item['store'], item['encoding'], item['sep'])
+            for step in item['steps']:
+                self.loaded_files[-1].pipeline.add_step(step)
+
+        x_col = view.get('x_col') or self.combo_x.currentText()
+        y_col = view.get('y_col') or self.combo_y.currentText()
+        self.combo_x.setCurrentText(x_col)
+        self.combo_y.setCurrentText(y_col)
+        self.last_x_col, self.last_y_col = x_col, y_col
+        xlim, ylim = view.get('xlim'), view.get('ylim')
+        if self.loaded_files and x_col and y_col:
+            self._draw_all_files(x_col, y_col, autoscale=not (xlim and ylim))
+            if xlim and ylim:
+                self.ax.set_xlim(xlim)
+                self.ax.set_ylim(ylim)
+                self._request_render('lod')
+        self.statusBar().showMessage(f"已打开会话: {path}（{len(files)} 个文件）")
+
+    def _apply_cache_settings(self):
+        """根据设置创建（或关闭）解析结果缓存"""
+        if not self.settings.value("cache/enabled", True, type=bool):
+            self.data_cache = None
+            return
+        cache_dir = self.settings.value("cache/dir", "", type=str) or DEFAULT_CACHE_DIR
+        max_mb = self.settings.value("cache/max_mb", DEFAULT_CACHE_MB, type=int)
+        self.data_cache = ParsedDataCache(cache_dir, max_mb * 1024 * 1024, version=LOADER_VERSION)
+
+    # 设置
+    def open_settings(self):
+        dlg = QDialog(self)
+        dlg.setWindowTitle("设置")
+        layout = QVBoxLayout(dlg)
+        form = QFormLayout()
+
+        chk_cache = QCheckBox("缓存解析结果，再次打开同一文件时直接读取")
+        chk_cache.setChecked(self.settings.value("cache/enabled", True, type=bool))
+        form.addRow(chk_cache)
+
+        edit_dir = QLineEdit(self.settings.value("cache/dir", "", type=str) or DEFAULT_CACHE_DIR)
+        btn_browse = QPushButton("浏览")
+        dir_layout = QHBoxLayout()
+        dir_layout.addWidget(edit_dir)
+        dir_layout.addWidget(btn_browse)
+        form.addRow("缓存目录", dir_layout)
+
+        spin_mb = QSpinBox()
+        spin_mb.setRange(0, 1024 * 1024)
+        spin_mb.setSuffix(" MB")
+        spin_mb.setValue(self.settings.value("cache/max_mb", DEFAULT_CACHE_MB, type=int))
+        form.addRow("缓存上限", spin_mb)
+
+        spin_history = QSpinBox()
+        spin_history.setRange(1, 1024 * 1024)
+        spin_history.setSuffix(" MB")
+        spin_history.setValue(self.settings.value("history/budget_mb", DEFAULT_HISTORY_MB, type=int))
+        form.addRow("撤回历史内存上限", spin_history)
+
+        spin_memory = QSpinBox()
+        spin_memory.setRange(64, 1024 * 1024)
+        spin_memory.setSuffix(" MB")
+        spin_memory.setValue(self.settings.value("memory/budget_mb", DEFAULT_MEMORY_MB, type=int))
+        form.addRow("数据内存预算（超出时换出最久未绘制的文件）", spin_memory)
+
+        chk_float32 = QCheckBox("以 float32 保存数值列（内存减半，约 7 位有效数字，对之后加载的文件生效）")
+        chk_float32.setChecked(self.settings.value("data/float32", False, type=bool))
+        form.addRow(chk_float32)
+
+        chk_sheets = QCheckBox("导入 Excel 的所有工作表（每个工作表为一条曲线，跳过不含所选 X/Y 列的工作表）")
+        chk_sheets.setChecked(self.settings.value("data/excel_all_sheets", False, type=bool))
+        form.addRow(chk_sheets)
+
+        spin_follow = QSpinBox()
+        spin_follow.setRange(100, 60000)
+        spin_follow.setSingleStep(100)
+        spin_follow.setSuffix(" ms")
+        spin_follow.setValue(self.settings.value("follow/interval_ms", DEFAULT_FOLLOW_MS, type=int))
+        form.addRow("跟随文件刷新间隔", spin_follow)
+        layout.addLayout(form)
+
+        def browse_dir():
+            d = QFileDialog.getExistingDirectory(dlg, "选择缓存目录", edit_dir.text())
+            if d:
+                edit_dir.setText(d)
+
+        def clear_cache():
+            if self.data_cache is not None:
+                self.data_cache.clear()
+            self.statusBar().showMessage("缓存已清空")
+
+        btn_browse.clicked.connect(browse_dir)
+        btn_clear_cache = QPushButton("清空缓存")
+        btn_clear_cache.clicked.connect(clear_cache)
+        layout.addWidget(btn_clear_cache)
+
+        btn_layout = QHBoxLayout()
+        btn_ok = QPushButton("确定")
+        btn_cancel = QPushButton("取消")
+        btn_layout.addWidget(btn_ok)
+        btn_layout.addWidget(btn_cancel)
+        layout.addLayout(btn_layout)
+
+        def on_ok():
+            self.settings.setValue("cache/enabled", chk_cache.isChecked())
+            self.settings.setValue("cache/dir", edit_dir.text().strip())
+            self.settings.setValue("cache/max_mb", spin_mb.value())
+            self.settings.setValue("history/budget_mb", spin_history.value())
+            self.settings.setValue("data/float32", chk_float32.isChecked())
+            self.settings.setValue("data/excel_all_sheets", chk_sheets.isChecked())
+            self.settings.setValue("follow/interval_ms", spin_follow.value())
+            self._follow_timer.setInterval(spin_follow.value())
+            self._apply_cache_settings()
+            self.history.set_budget(spin_history.value() * 1024 * 1024)
+            self.settings.setValue("memory/budget_mb", spin_memory.value())
+            self.memory.set_budget(spin_memory.value() * 1024 * 1024)
+            self._enforce_memory()
+            if self.data_cache is not None:
+                self.data_cache.evict()
+            dlg.accept()
+            self.statusBar().showMessage("设置已保存")
+
+        btn_ok.clicked.connect(on_ok)
+        btn_cancel.clicked.connect(dlg.reject)
+        dlg.exec()
+
     # 打开文件
     def open_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "选择数据文件", "", "Text Files (*.txt *.csv);;All Files (*)"
+            self, "选择数据文件", "", "Text Files (*.txt *.csv *.dat);;Compressed Files (*.gz *.xz *.bz2 *.zip);;All Files (*)"
         )
         if file_path:
-            self.load_file(file_path)
-            self.plot_selected()
+            # 与拖入文件相同，在后台解析，完成后自动绘图
+            self.load_files_async([file_path])
 
     # 拖拽事件
     def dragEnterEvent(self, event):
@@ -802,139 +1278,360 @@ class PlotApp(QMainWindow):
             event.acceptProposedAction()
 
     def dropEvent(self, event):
-        for url in event.mimeData().urls():
-            file_path = url.toLocalFile()
-            self.load_file(file_path)
-        # 拖入后自动绘图
-        self.plot_selected()
+        file_paths = [url.toLocalFile() for url in event.mimeData().urls()]
+        # 拖入的是会话目录时直接打开会话
+        sessions = [p for p in file_paths if p and os.path.isdir(p) and is_session_dir(p)]
+        if sessions:
+            self.restore_session(sessions[0])
+            return
+        # 拖入的文件夹展开为其中的文件（与导入文件夹的筛选相同）；后台并行解析，全部完成后自动绘图
+        paths = []
+        for p in file_paths:
+            if p and os.path.isdir(p):
+                paths.extend(list_folder_files(p))
+            elif p:
+                paths.append(p)
+        if not paths:
+            self.statusBar().showMessage("拖入的文件夹中没有文件")
+            return
+        self.load_files_async(paths)
     
-    # 加载文件
-    def load_file(self, file_path):
-        ext = os.path.splitext(file_path)[1].lower()
-        chosen_sep = None
-        try:
-            if ext in [".xls", ".xlsx"]:
-                # 读取 Excel 文件
-                df = pd.read_excel(file_path, header=0)  # 默认第一行作为列名
-                chosen_sep = None  # Excel 不涉及分隔符
-                enc_used = "Excel"
-                
-            else:
-                # 读取文本文件
-                def try_read_text_with_encodings(path, encodings):
-                    for enc_try in encodings:
-                        if not enc_try:
-                            continue
-                        try:
-                            with open(path, 'r', encoding=enc_try) as f:
-                                return f.read(), enc_try
-                        except Exception:
-                            continue
-                    return None, None
-        
-                # 判断是否 VSM 文件
-                with open(file_path, 'r', encoding='ascii', errors='ignore') as f:
-                    preview_lines = [ln.strip() for ln in f.readlines()[:10] if ln.strip()]
-                is_vsm = any("vsm" in ln.lower() for ln in preview_lines)
-
-                if is_vsm:
-                    # VSM 文件固定读取方式
-                    df = pd.read_csv(
-                        file_path,
-                        skiprows=31,       # 跳过头信息
-                        header=None,
-                        usecols=[3, 4]     # Bz 和 emu
-                    )
-                    df.columns = ['B (Oe)', 'M (emu)']
-                    chosen_sep = ','  # 方便状态栏显示
-                    enc_used = "VSM"
+    def _store_dtype(self):
+        """数值列的存储精度（设置中可选 float32 以减半内存）"""
+        return np.float32 if self.settings.value("data/float32", False, type=bool) else np.float64
+
+    def _load_options(self):
+        """传给读取器的读取选项（设置中的 Excel 全部工作表）"""
+        options = {}
+        if self.settings.value("data/excel_all_sheets", False, type=bool):
+            options['all_sheets'] = True
+        return options
+
+    def _prefetch_columns(self):
+        """读取文件时顺带读入内存的列：当前选择的 X/Y 列，其余列首次被选中时才读取"""
+        return tuple(c for c in (self.combo_x.currentText() or self.last_x_col,
+                                 self.combo_y.currentText() or self.last_y_col) if c)
+
+    def _add_loaded_file(self, file_path, store, enc_used, chosen_sep):
+        """把解析好的数据加入 loaded_files，并更新下拉菜单与状态栏"""
+        # 更新数据存储（与已加载的文件内容相同时共用同一列存储，只是名称和处理流程各自独立）
+        same = next((other for other in self.loaded_files if other.store is store), None)
+        lf = LoadedFile(file_path, store, enc_used, chosen_sep)
+        self.loaded_files.append(lf)
+        self.col_unicode_map.update({col: latex_to_unicode(str(col)) for col in store.columns})
+
+        # 更新下拉菜单（使用最新文件的数值列，非数值列不能用于绘图）
+        columns = lf.numeric_columns
+        self.combo_x.clear()
+        self.combo_y.clear()
+        self.combo_x.addItems(columns)
+        self.combo_y.addItems(columns)
+
+        # 记录默认列（仪器文件优先使用该格式的默认列，如 VSM 的磁场和磁矩）
+        defaults = store.default_axes or columns[:2]
+        if not self.last_x_col and defaults:
+            self.last_x_col = defaults[0]
+        if not self.last_y_col and len(defaults) > 1:
+            self.last_y_col = defaults[1]
+        self.combo_x.setCurrentText(self.last_x_col)
+        self.combo_y.setCurrentText(self.last_y_col)
 
-                else:
-                # 编码检测
-                    import chardet
-                    with open(file_path, 'rb') as f:
-                        raw = f.read(5000)
-                        detected = chardet.detect(raw)
-                    enc_candidates = [detected.get('encoding'), 'utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'gbk', 'big5', 'mac_roman']
-
-                    text, enc_used = try_read_text_with_encodings(file_path, enc_candidates)
-                    if text is None:
-                        raise ValueError("无法用常见编码读取文件")
-                    
-                    else:
-                        # 分隔符检测
-                        lines = [ln for ln in text.splitlines() if ln.strip()][:10]
-                        if not lines:
-                            raise ValueError("文件为空或只包含空行")
-                        header_line = lines[0]
-                        data_line = lines[1] if len(lines) > 1 else lines[0]
-                        sep_candidates = ['\t', ',', ';', r'\s+']
-                        chosen_sep = None
-                        for sep in sep_candidates:
-                            try:
-                                if sep == r'\s+':
-                                    hcols = re.split(r'\s+', header_line.strip())
-                                    dcols = re.split(r'\s+', data_line.strip())
-                                else:
-                                    hcols = header_line.split(sep)
-                                    dcols = data_line.split(sep)
-                                if len(hcols) > 1 and abs(len(hcols) - len(dcols)) <= 0:
-                                    chosen_sep = sep
-                                    break
-                            except Exception:
-                                continue
-
-                    if chosen_sep:
-                        df = pd.read_csv(StringIO(text), sep=chosen_sep, engine='python')
-                    else:
-                        df = pd.read_fwf(StringIO(text))
-                        chosen_sep = 'fwf'
-
-            # 列名清理
-            def clean_col_name(s):
-                s = str(s).strip()
-                s = re.sub(r'\s+', ' ', s)
-                return s
-            df.columns = [clean_col_name(c) for c in df.columns]
-
-            # 修复常见乱码
-            def fix_garbled(s: str) -> str:
-                return (
-                    s.replace('¦È', 'θ')
-                    .replace('¡ã', '°')
-                    .replace('¦¸', 'Ω')
-                    .replace('Â', '')
-                    .strip()
-                )
-            df.columns = [fix_garbled(c) for c in df.columns]
+        # 状态栏
+        skipped = [c for c in store.columns if c not in columns]
+        if skipped:
+            print("非数值列（不可绘图）:", skipped)
+        msg = f"已加载文件：{file_path} (编码: {enc_used}, 分隔符: {repr(chosen_sep)})"
+        if same is not None:
+            msg += f"，与 {same.name} 内容相同，共用已读取的数据"
+        self.statusBar().showMessage(msg)
+        print(f"已加载文件: {file_path}, 编码: {enc_used}, 分隔符: {repr(chosen_sep)}")
+        print("列名:", store.columns, "行数:", len(store))
+        if store.header:
+            print("文件头信息:", store.header)
+
+    # 批量导入：在线程池中并行解析，界面保持响应
+    def load_files_async(self, file_paths):
+        if self._ingest is not None:
+            self.statusBar().showMessage("正在导入文件，请稍候")
+            return
+        if not file_paths:
+            return
 
-            # 更新数据存储
-            self.loaded_files.append((file_path, df))
-            self.col_unicode_map.update({col: latex_to_unicode(str(col)) for col in df.columns})
+        cancel_event = threading.Event()
+        # 各文件已读取的比例（工作线程写入，定时器读取），进度条按百分比显示
+        fractions = [0.0] * len(file_paths)
+
+        def make_progress(k):
+            def progress(done, total):
+                if cancel_event.is_set():
+                    raise LoadCancelled()
+                fractions[k] = done / total if total else 1.0
+            return progress
+
+        workers = max(1, min(INGEST_WORKERS, len(file_paths)))
+        pool = ThreadPoolExecutor(max_workers=workers)
+        dtype, prefetch, options = self._store_dtype(), self._prefetch_columns(), self._load_options()
+        futures = [pool.submit(load_data_file, path, make_progress(k), self.data_cache, dtype, prefetch, options,
+                               self.shared_stores)
+                   for k, path in enumerate(file_paths)]
+
+        label = (f"正在读取 {os.path.basename(file_paths[0])}…" if len(file_paths) == 1
+                 else f"正在导入 {len(file_paths)} 个文件…")
+        progress = QProgressDialog(label, "取消", 0, len(file_paths) * 100, self)
+        progress.setWindowTitle("导入文件")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+        progress.setValue(0)
+
+        timer = QTimer(self)
+        timer.setInterval(50)
+        self._ingest = {
+            'paths': list(file_paths),
+            'futures': futures,
+            'fractions': fractions,
+            'pool': pool,
+            'cancel': cancel_event,
+            'progress': progress,
+            'timer': timer,
+        }
+        progress.canceled.connect(self._cancel_ingest)
+        timer.timeout.connect(self._poll_ingest)
+        timer.start()
+
+    def _cancel_ingest(self):
+        ingest = self._ingest
+        if ingest is None:
+            return
+        ingest['cancel'].set()
+        for fut in ingest['futures']:
+            fut.cancel()
 
-            # 更新下拉菜单（使用最新文件列名）
-            self.combo_x.clear()
-            self.combo_y.clear()
-            self.combo_x.addItems(df.columns)
-            self.combo_y.addItems(df.columns)
-
-            # 记录默认列
-            if not self.last_x_col:
-                self.last_x_col = df.columns[0]
-            if not self.last_y_col and len(df.columns) > 1:
-                self.last_y_col = df.columns[1]
-            self.combo_x.setCurrentText(self.last_x_col)
-            self.combo_y.setCurrentText(self.last_y_col)
-
-            # 状态栏
-            self.statusBar().showMessage(f"已加载文件：{file_path} (编码: {enc_used}, 分隔符: {repr(chosen_sep)})")
-            print(f"已加载文件: {file_path}, 编码: {enc_used}, 分隔符: {repr(chosen_sep)}")
-            print("列名:", df.columns.tolist())
-            print(df.head())
+    def _poll_ingest(self):
+        ingest = self._ingest
+        if ingest is None:
+            return
+        futures = ingest['futures']
+        done = sum(1 for fut in futures if fut.done())
+        if not ingest['cancel'].is_set():
+            ingest['progress'].setValue(int(sum(100 if fut.done() else min(frac, 1.0) * 100
+                                                for fut, frac in zip(futures, ingest['fractions']))))
+        if done < len(futures):
+            return
 
-        except Exception as e:
-            self.statusBar().showMessage(f"文件读取失败: {e}")
-            print("读取文件错误:", e)
+        ingest['timer'].stop()
+        ingest['pool'].shutdown(wait=False)
+        ingest['progress'].close()
+        self._ingest = None
+
+        # 按拖入顺序合并结果，最后只重绘一次
+        loaded = failed = skipped = 0
+        sheets = []  # 不包含所选列而跳过的工作表
+        for path, fut in zip(ingest['paths'], futures):
+            if fut.cancelled():
+                skipped += 1
+                continue
+            try:
+                datasets = fut.result()
+            except LoadCancelled:
+                skipped += 1
+                continue
+            except Exception as e:
+                failed += 1
+                print(f"读取文件错误: {path}: {e}")
+                continue
+            for store, enc_used, chosen_sep in datasets:
+                self._add_loaded_file(path, store, enc_used, chosen_sep)
+                loaded += 1
+            sheets.extend(f"{os.path.basename(path)}: {name}" for name in datasets.skipped)
+
+        # 解析期间在文件目录中被取消勾选的文件
+        for path in self._catalog_loading:
+            item = self._catalog_items.get(path)
+            if item is not None and item.checkState() != Qt.Checked:
+                self._park_catalog_file(path, replot=False)
+        self._catalog_loading.clear()
+
+        if loaded:
+            self.plot_selected()
+        msg = f"已导入 {loaded} 组数据"
+        if failed:
+            msg += f"，{failed} 个读取失败"
+        if skipped:
+            msg += f"，{skipped} 个已取消"
+        if sheets:
+            msg += f"，跳过不包含所选列的工作表：{', '.join(sheets)}"
+            print("跳过的工作表:", sheets)
+        self.statusBar().showMessage(msg)
+
+    # =============== 文件夹导入 ===============
+    def open_folder_catalog(self):
+        """导入文件夹：先只读取各文件的文件头列出目录，勾选的文件才解析并绘制"""
+        folder = QFileDialog.getExistingDirectory(self, "选择数据文件夹")
+        if not folder:
+            return
+        paths = list_folder_files(folder)
+        if not paths:
+            self.statusBar().showMessage("文件夹中没有文件")
+            return
+        self._show_catalog(folder, paths)
+
+    def _show_catalog(self, folder, paths):
+        if self._catalog_dock is None:
+            table = QTableWidget(0, 5)
+            table.setHorizontalHeaderLabels(["文件", "大小", "格式", "列", "行数（估计）"])
+            table.setEditTriggers(QTableWidget.NoEditTriggers)
+            table.verticalHeader().setVisible(False)
+            table.itemChanged.connect(self._on_catalog_item_changed)
+            self._catalog_dock = QDockWidget("文件目录", self)
+            self._catalog_dock.setWidget(table)
+            self.addDockWidget(Qt.LeftDockWidgetArea, self._catalog_dock)
+        self._stop_catalog_scan()
+        table = self._catalog_dock.widget()
+        self._catalog_dock.setWindowTitle(f"文件目录 - {folder}")
+        self._catalog_dock.show()
+
+        # 已勾选的文件保留在 loaded_files 中，只是不再出现在目录里
+        self._catalog_items = {}
+        self._catalog_parked.clear()
+        self._catalog_pending.clear()
+        table.blockSignals(True)
+        table.setRowCount(len(paths))
+        for row, path in enumerate(paths):
+            item = QTableWidgetItem(os.path.relpath(path, folder))
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+            item.setData(Qt.UserRole, path)
+            item.setToolTip(path)
+            table.setItem(row, 0, item)
+            for col in range(1, 5):
+                table.setItem(row, col, QTableWidgetItem("…" if col > 1 else ""))
+            self._catalog_items[path] = item
+        table.blockSignals(False)
+
+        # 后台读取文件头，完成一个填一行
+        pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS)
+        timer = QTimer(self)
+        timer.setInterval(100)
+        self._catalog_scan = {
+            'pool': pool,
+            'timer': timer,
+            'futures': [(row, pool.submit(describe_file, path)) for row, path in enumerate(paths)],
+        }
+        timer.timeout.connect(self._poll_catalog_scan)
+        timer.start()
+        self.statusBar().showMessage(f"正在读取 {len(paths)} 个文件的文件头…")
+
+    def _stop_catalog_scan(self):
+        scan = self._catalog_scan
+        if scan is None:
+            return
+        scan['timer'].stop()
+        scan['pool'].shutdown(wait=False, cancel_futures=True)
+        self._catalog_scan = None
+
+    def _poll_catalog_scan(self):
+        scan = self._catalog_scan
+        if scan is None:
+            return
+        table = self._catalog_dock.widget()
+        table.blockSignals(True)
+        remaining = []
+        for row, fut in scan['futures']:
+            if not fut.done():
+                remaining.append((row, fut))
+                continue
+            try:
+                info = fut.result()
+            except Exception as e:
+                # 无法识别的文件仍然列出，勾选时再报告读取错误
+                table.item(row, 2).setText("未知")
+                table.item(row, 2).setToolTip(str(e))
+                table.item(row, 3).setText("")
+                table.item(row, 4).setText("")
+                continue
+            columns = info['columns']
+            table.item(row, 1).setText(format_size(info['size']))
+            table.item(row, 2).setText(info['format'] or "")
+            table.item(row, 3).setText(", ".join(columns) if columns else "")
+            table.item(row, 3).setToolTip("\n".join(columns) if columns else "")
+            table.item(row, 4).setText(f"{info['rows']:,}" if info['rows'] is not None else "")
+        table.blockSignals(False)
+        scan['futures'] = remaining
+        if not remaining:
+            self._stop_catalog_scan()
+            table.resizeColumnsToContents()
+            self.statusBar().showMessage(f"已列出 {table.rowCount()} 个文件，勾选的文件才会读取并绘制")
+
+    def _on_catalog_item_changed(self, item):
+        if item.column() != 0:
+            return
+        path = item.data(Qt.UserRole)
+        if item.checkState() == Qt.Checked:
+            parked = self._catalog_parked.pop(path, None)
+            if parked is not None:
+                # 之前解析过：直接放回，列数据在绘图时从缓存（内存映射）或原文件重新读取
+                self.loaded_files.extend(parked)
+                self.plot_selected()
+            elif path not in self._catalog_pending and path not in self._catalog_loading:
+                self._catalog_pending.append(path)
+                self._flush_catalog_pending()
+        elif path in self._catalog_pending:
+            self._catalog_pending.remove(path)
+        else:
+            # 正在解析的文件在导入完成后再移出
+            self._park_catalog_file(path)
+
+    def _flush_catalog_pending(self):
+        """导入任务空闲时解析所有已勾选的文件，否则稍后再试"""
+        if not self._catalog_pending:
+            return
+        if self._ingest is not None:
+            QTimer.singleShot(200, self._flush_catalog_pending)
+            return
+        paths, self._catalog_pending = self._catalog_pending, []
+        self._catalog_loading.update(paths)
+        self.load_files_async(paths)
+
+    def _park_catalog_file(self, path, replot=True):
+        """把取消勾选的文件移出 loaded_files 并释放其列数据（处理步骤保留）"""
+        removed = [lf for lf in self.loaded_files if lf.path == path]
+        if not removed:
+            return
+        self.loaded_files[:] = [lf for lf in self.loaded_files if lf.path != path]
+        # 与仍在图中的文件共用的列存储不释放
+        in_use = {id(lf.store) for lf in self.loaded_files}
+        freed = 0
+        for lf in removed:
+            self._followers.pop(lf, None)
+            if id(lf.store) not in in_use:
+                freed += lf.evict()
+        self._catalog_parked[path] = removed
+        # 再次勾选时直接放回，不需要按内容共享；共享记录只保留仍在图中的列存储
+        self.shared_stores.retain([lf.store for lf in self.loaded_files])
+        # 历史按文件下标记录，移出文件后不再有效
+        self.history.clear()
+        if not replot:
+            return
+        if self.loaded_files:
+            # 曲线与文件按下标对齐，移出文件后重建坐标轴
+            self._axes_ready = False
+            self.plot_selected()
+        else:
+            self._setup_axes()
+            self._request_render('full')
+        self.statusBar().showMessage(f"已移出 {os.path.basename(path)}，释放 {format_size(freed)}")
+
+    def _uncheck_catalog(self):
+        """清空已加载的文件后，文件目录中的勾选全部取消"""
+        self._catalog_parked.clear()
+        self._catalog_pending.clear()
+        if self._catalog_dock is None:
+            return
+        table = self._catalog_dock.widget()
+        table.blockSignals(True)
+        for item in self._catalog_items.values():
+            item.setCheckState(Qt.Unchecked)
+        table.blockSignals(False)
 
     # 绘图
     def plot_selected(self):
@@ -956,9 +1653,15 @@ class PlotApp(QMainWindow):
 
     # 清空
     def clear_plot(self):
-        self.ax.clear()
-        self.canvas.draw()
+        self._setup_axes()
+        self._request_render('full')
         self.loaded_files.clear()
+        # 历史按文件下标记录，清空文件后不再有效
+        self.history.clear()
+        self._followers.clear()
+        self._follow_timer.stop()
+        self._uncheck_catalog()
+        self.shared_stores.retain([])
         # 清空下拉选择并重置记录的列
         try:
             self.combo_x.clear()
@@ -980,24 +1683,20 @@ class PlotApp(QMainWindow):
             self.statusBar().showMessage("请选择 Y 列")
             return
         
-        # 保存当前状态以便撤回
-        self.history.append(copy.deepcopy(self.loaded_files))
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
-
-        changed = False
-        for file_path, df in self.loaded_files:
-            if y_col in df.columns:
-                try:
-                    df[y_col] = center_data(df[y_col])
-                    changed = True
-                    print(f"[center] applied to {os.path.basename(file_path)} ({y_col})")
-                except Exception as e:
-                    print(f"[center] failed on {file_path}: {e}")
+        # 在处理流程末尾追加对称步骤（原始数据不变，结果在绘图时按需计算）
+        added = []
+        for fi, lf in enumerate(self.loaded_files):
+            file_path = lf.path
+            if lf.has_numeric(y_col):
+                step = CenterStep(y_col)
+                lf.pipeline.add_step(step)
+                added.append((fi, step))
+                print(f"[center] applied to {os.path.basename(file_path)} ({y_col})")
             else:
                 print(f"[center] skip {os.path.basename(file_path)}: no column {y_col}")
 
-        if changed:
+        self.history.push(AddStepsEdit("对称处理", added))
+        if added:
             self.statusBar().showMessage(f"对称处理完成（列: {y_col})")
             self.replot_all()
         else:
@@ -1014,28 +1713,20 @@ class PlotApp(QMainWindow):
             self.statusBar().showMessage("请选择 Y 列")
             return
         
-        # 保存当前状态以便撤回
-        self.history.append(copy.deepcopy(self.loaded_files))
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
-
-        changed = False
-        for file_path, df in self.loaded_files:
-            if y_col in df.columns:
-                try:
-                    # 先对称
-                    df[y_col] = center_data(df[y_col])
-                    # 再归一化
-                    normalized_Y, top_n_avg = normalize_data(df[y_col])
-                    df[y_col] = normalized_Y
-                    changed = True
-                    print(f"[normalize] applied to {os.path.basename(file_path)} ({y_col}), top_n_avg={top_n_avg}")
-                except Exception as e:
-                    print(f"[normalize] failed on {file_path}: {e}")
+        # 在处理流程末尾追加归一化步骤（先对称再归一化）
+        added = []
+        for fi, lf in enumerate(self.loaded_files):
+            file_path = lf.path
+            if lf.has_numeric(y_col):
+                step = NormalizeStep(y_col)
+                lf.pipeline.add_step(step)
+                added.append((fi, step))
+                print(f"[normalize] applied to {os.path.basename(file_path)} ({y_col})")
             else:
                 print(f"[normalize] skip {os.path.basename(file_path)}: no column {y_col}")
 
-        if changed:
+        self.history.push(AddStepsEdit("归一化", added))
+        if added:
             self.statusBar().showMessage(f"归一化完成（列: {y_col})")
             self.replot_all()
         else:
@@ -1054,11 +1745,6 @@ class PlotApp(QMainWindow):
             self.statusBar().showMessage("请先选择 X/Y 列")
             return
         
-        # 保存当前状态以便撤回
-        self.history.append(copy.deepcopy(self.loaded_files))
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
-
         # 弹出表格让用户输入每条曲线的区间
         dlg = QDialog(self)
         dlg.setWindowTitle("设置去线性背景拟合区间")
@@ -1073,8 +1759,8 @@ class PlotApp(QMainWindow):
         table.setColumnCount(3)
         table.setHorizontalHeaderLabels(["文件名", "x_min", "x_max"])
 
-        for i, (path, df) in enumerate(self.loaded_files):
-            table.setItem(i, 0, QTableWidgetItem(os.path.basename(path)))
+        for i, lf in enumerate(self.loaded_files):
+            table.setItem(i, 0, QTableWidgetItem(lf.name))
             table.setItem(i, 1, QTableWidgetItem(""))  # 默认空
             table.setItem(i, 2, QTableWidgetItem(""))
 
@@ -1090,21 +1776,26 @@ class PlotApp(QMainWindow):
         dlg.setLayout(layout)
 
         def on_ok():
-            for i, (path, df) in enumerate(self.loaded_files):
+            # 每个填写了有效区间的文件在处理流程末尾追加去背底步骤
+            added = []
+            for i, lf in enumerate(self.loaded_files):
+                path = lf.path
                 item_min = table.item(i, 1)
                 item_max = table.item(i, 2)
                 try:
                     B_min = float(item_min.text())
                     B_max = float(item_max.text())
-                    if x_col in df.columns and y_col in df.columns:
-                        mask = (df[x_col] >= B_min) & (df[x_col] <= B_max)
-                        if mask.any():
-                            p = np.polyfit(df.loc[mask, x_col], df.loc[mask, y_col], 1)
-                            df[y_col] = df[y_col] - np.polyval(p, df[x_col])
+                    if lf.has_numeric(x_col, y_col):
+                        step = BackgroundStep(x_col, y_col, B_min, B_max)
+                        # 拟合区间内只使用未删除的点；区间内没有点时跳过该文件
+                        if step.window_mask(lf.column(x_col), lf.column(y_col), lf.keep).any():
+                            lf.pipeline.add_step(step)
+                            added.append((i, step))
                             print(f"[background] 去线性基底: {os.path.basename(path)} ({y_col})")
                 except Exception:
                     # 空或者无效输入则跳过
                     continue
+            self.history.push(AddStepsEdit("去背底", added))
             dlg.accept()
             self.statusBar().showMessage("去背景处理完成")
             self.replot_all()
@@ -1113,6 +1804,245 @@ class PlotApp(QMainWindow):
         btn_cancel.clicked.connect(dlg.reject)
         dlg.exec()
 
+    #查看和编辑各文件的处理流程：移除步骤、修改去背底的拟合区间
+    def open_pipeline(self):
+        if not self.loaded_files:
+            self.statusBar().showMessage("请先加载数据文件")
+            return
+
+        dlg = QDialog(self)
+        dlg.setWindowTitle("处理流程")
+        dlg.resize(640, 400)
+        layout = QVBoxLayout(dlg)
+
+        label = QLabel("原始数据不会被修改；移除或修改某一步后，只重新计算该文件在这一步之后的结果")
+        label.setWordWrap(True)
+        layout.addWidget(label)
+
+        table = QTableWidget(dlg)
+        table.setColumnCount(5)
+        table.setHorizontalHeaderLabels(["文件名", "步骤", "说明", "x_min", "x_max"])
+        table.setSelectionBehavior(QTableWidget.SelectRows)
+        layout.addWidget(table)
+        row_refs = []  # 表格行 -> (文件下标, 步骤)
+
+        def fill_table():
+            row_refs.clear()
+            for fi, lf in enumerate(self.loaded_files):
+                for step in lf.pipeline.steps:
+                    row_refs.append((fi, step))
+            table.setRowCount(len(row_refs))
+            for r, (fi, step) in enumerate(row_refs):
+                cells = [self.loaded_files[fi].name, step.name, step.describe()]
+                if isinstance(step, BackgroundStep):
+                    cells += [f"{step.x_min:g}", f"{step.x_max:g}"]
+                else:
+                    cells += ["", ""]
+                for c, text in enumerate(cells):
+                    item = QTableWidgetItem(text)
+                    # 只有去背底的拟合区间可以编辑
+                    if c < 3 or not isinstance(step, BackgroundStep):
+                        item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+                    table.setItem(r, c, item)
+
+        fill_table()
+
+        btn_layout = QHBoxLayout()
+        btn_remove = QPushButton("移除所选步骤")
+        btn_apply = QPushButton("应用区间修改")
+        btn_close = QPushButton("关闭")
+        btn_layout.addWidget(btn_remove)
+        btn_layout.addWidget(btn_apply)
+        btn_layout.addWidget(btn_close)
+        layout.addLayout(btn_layout)
+
+        def remove_selected():
+            rows = sorted({idx.row() for idx in table.selectedIndexes()})
+            if not rows:
+                self.statusBar().showMessage("请先选择要移除的步骤")
+                return
+            # 同一文件内从后往前移除，撤回时按相反顺序插回原位置
+            targets = sorted(((row_refs[r][0], self.loaded_files[row_refs[r][0]].pipeline.index(row_refs[r][1]))
+                              for r in rows), reverse=True)
+            removed = []
+            for fi, index in targets:
+                step = self.loaded_files[fi].pipeline.remove_step(index)
+                self.history.push(RemoveStepEdit(f"移除{step.name}", fi, index, step))
+                removed.append(step)
+            fill_table()
+            # 只恢复了被删除的点时保留当前视图
+            self.replot_all(preserve_view=all(isinstance(step, MaskStep) for step in removed))
+            self.statusBar().showMessage(f"已移除 {len(targets)} 个处理步骤")
+
+        def apply_windows():
+            changed = 0
+            for r, (fi, step) in enumerate(row_refs):
+                if not isinstance(step, BackgroundStep):
+                    continue
+                try:
+                    x_min = float(table.item(r, 3).text())
+                    x_max = float(table.item(r, 4).text())
+                except Exception:
+                    # 无效输入则保持原区间
+                    continue
+                edit = StepParamsEdit("修改拟合区间", fi, step,
+                                      {'x_min': step.x_min, 'x_max': step.x_max},
+                                      {'x_min': x_min, 'x_max': x_max})
+                if edit:
+                    edit.redo(self.loaded_files)
+                    self.history.push(edit)
+                    changed += 1
+            fill_table()
+            if changed:
+                self.replot_all()
+            self.statusBar().showMessage(f"已修改 {changed} 个拟合区间")
+
+        btn_remove.clicked.connect(remove_selected)
+        btn_apply.clicked.connect(apply_windows)
+        btn_close.clicked.connect(dlg.accept)
+        dlg.exec()
+
+    #跟随模式：选择仍在被仪器写入的文件，定时读取新追加的行
+    def open_follow_dialog(self):
+        if not self.loaded_files:
+            self.statusBar().showMessage("请先加载数据文件")
+            return
+
+        dlg = QDialog(self)
+        dlg.setWindowTitle("跟随文件")
+        layout = QVBoxLayout(dlg)
+        label = QLabel("勾选仍在写入的文件，软件会定时读取新追加的数据并延长曲线（刷新间隔可在设置中修改）")
+        label.setWordWrap(True)
+        layout.addWidget(label)
+
+        checks = []
+        for lf in self.loaded_files:
+            chk = QCheckBox(lf.name)
+            chk.setChecked(lf in self._followers)
+            if not can_follow(lf.store.source):
+                chk.setEnabled(False)
+                chk.setToolTip("该文件格式不支持跟随模式")
+            layout.addWidget(chk)
+            checks.append((lf, chk))
+
+        btn_layout = QHBoxLayout()
+        btn_ok = QPushButton("确定")
+        btn_cancel = QPushButton("取消")
+        btn_layout.addWidget(btn_ok)
+        btn_layout.addWidget(btn_cancel)
+        layout.addLayout(btn_layout)
+
+        def on_ok():
+            for lf, chk in checks:
+                if chk.isChecked() and lf not in self._followers:
+                    self._start_follow(lf)
+                elif not chk.isChecked() and lf in self._followers:
+                    del self._followers[lf]
+            if self._followers:
+                self._follow_timer.start()
+                self.statusBar().showMessage(f"正在跟随 {len(self._followers)} 个文件")
+            else:
+                self._follow_timer.stop()
+                self.statusBar().showMessage("已停止跟随文件")
+            dlg.accept()
+
+        btn_ok.clicked.connect(on_ok)
+        btn_cancel.clicked.connect(dlg.reject)
+        dlg.exec()
+
+    def _start_follow(self, lf):
+        """开始跟随一个文件：从已读取数据的末尾开始，之后每次只解析新追加的完整行"""
+        try:
+            follower = FileFollower.start(lf.path, lf.store.source, lf.store.numeric, len(lf.store))
+            # 列存储可能与内容相同的其他文件共用，追加行之前换成自己的一份
+            lf.store = lf.pipeline.store = lf.store.copy()
+            # 追加行时所有列都要在内存中
+            lf.store.load_all()
+        except Exception as e:
+            self.statusBar().showMessage(f"无法跟随 {lf.name}: {e}")
+            print("跟随文件错误:", e)
+            return False
+        self._followers[lf] = follower
+        return True
+
+    def _poll_followers(self):
+        """定时检查跟随中的文件，把新追加的行加入数据并延长曲线"""
+        updated = []
+        for lf, follower in list(self._followers.items()):
+            if lf not in self.loaded_files:
+                del self._followers[lf]
+                continue
+            try:
+                polled = follower.poll()
+            except Exception as e:
+                del self._followers[lf]
+                self.statusBar().showMessage(f"已停止跟随 {lf.name}: {e}")
+                print("跟随文件错误:", e)
+                continue
+            if polled is None:
+                continue
+            new, overlap = polled
+            lf.store.append(new, overlap)
+            lf.pipeline.invalidate(0)
+            updated.append((lf, overlap))
+        if not self._followers:
+            self._follow_timer.stop()
+        if updated:
+            self._extend_followed_lines(updated)
+
+    def _extend_followed_lines(self, updated):
+        """
+        跟随模式下更新曲线
+
+        只是在末尾增加了点时，把新曲线段 blit 到缓存的背景上，不重新渲染已有曲线；
+        有依赖全部数据的处理步骤（已有的点也会变化）或新点超出了原本包含全部数据的视图时，完整重绘。
+        """
+        if self._plot_cols is None:
+            return
+        x_col, y_col = self._plot_cols
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        # 追加前视图是否包含了全部数据：是则新数据超出视图时自动扩展视图
+        fit_view = all(xs.min() >= x0 and xs.max() <= x1 and ys.min() >= y0 and ys.max() <= y1
+                       for _, xs, ys, _ in (e for e in self._lod_lines if e is not None and e[1] is not None)
+                       if len(xs))
+        n_cols = self._lod_columns()
+        incremental = True
+        segments = []
+        n_new = 0
+        for lf, overlap in updated:
+            fi = self.loaded_files.index(lf)
+            entry = self._lod_lines[fi] if fi < len(self._lod_lines) else None
+            if entry is None:
+                continue
+            old_n = len(self._line_arrays(fi)[0])
+            xs, ys, rows = self._line_data(lf, x_col, y_col)
+            entry[1], entry[2], entry[3] = xs, ys, rows
+            n_new += len(xs) - old_n
+            if overlap or any(not isinstance(step, MaskStep) for step in lf.pipeline.steps):
+                incremental = False
+                continue
+            seg_x, seg_y = xs[max(old_n - 1, 0):], ys[max(old_n - 1, 0):]
+            if len(xs) == old_n or not len(seg_x):
+                continue
+            if fit_view and (seg_x.min() < x0 or seg_x.max() > x1 or seg_y.min() < y0 or seg_y.max() > y1):
+                incremental = False
+                continue
+            line = entry[0]
+            dx, dy, reduced = minmax_decimate(xs, ys, x0, x1, n_cols)
+            line.set_data(dx, dy)
+            line.set_marker('None' if reduced else 'o')
+            segments.append(self._tail_segment(line, seg_x, seg_y))
+        self._data_version += 1
+        self._lod_xlim = None
+
+        if not incremental:
+            self._draw_all_files(x_col, y_col, autoscale=fit_view)
+        elif segments:
+            self._tail_segments.extend(segments)
+            self._request_render('tail')
+        self.statusBar().showMessage(f"跟随中：新增 {n_new} 个点")
+
     #重新绘制所有当前曲线（使用当前 combo 中的列
     def replot_all(self, preserve_view=False):
         if not getattr(self, "loaded_files", None):
@@ -1125,53 +2055,24 @@ class PlotApp(QMainWindow):
             self.statusBar().showMessage("请先选择 X/Y 列以重新绘制", 3000)
             return
         
-        # 如果需要保留当前视图（缩放/平移），在绘制前保存坐标范围并在绘制后恢复
-        cur_xlim = None
-        cur_ylim = None
-        if preserve_view:
-            try:
-                cur_xlim = self.ax.get_xlim()
-                cur_ylim = self.ax.get_ylim()
-            except Exception:
-                cur_xlim = None
-                cur_ylim = None
-
         try:
-            self._draw_all_files(x_col, y_col)
-            # 在成功重绘之后，恢复视图范围（如果之前保存了）
-            if preserve_view and (cur_xlim is not None) and (cur_ylim is not None):
-                try:
-                    self.ax.set_xlim(cur_xlim)
-                    self.ax.set_ylim(cur_ylim)
-                    # 触发一次绘制以确保视图更新
-                    self.canvas.draw()
-                except Exception:
-                    pass
-
+            # 曲线对象在重绘之间保留，需要保留视图时只更新数据、不重新自动缩放
+            self._draw_all_files(x_col, y_col, autoscale=not preserve_view)
             self.statusBar().showMessage(f"已重新绘制所有文件(X={x_col}, Y={y_col})", 3000)
         except Exception as e:
             self.statusBar().showMessage(f"绘图时出错：{e}", 5000)
     
-    #核心绘图函数：根据当前 loaded_files 绘制曲线并统一样式
-    def _draw_all_files(self, x_col, y_col):
-        # 延迟初始化 matplotlib 样式（仅首次绘图时执行）
-        _initialize_mpl_style()
-        
+    #坐标轴初始化：清空并设置刻度、网格等样式（仅在首次绘图或清空后执行）
+    def _setup_axes(self):
         self.ax.clear()
-        for file_path, df in self.loaded_files:
-            if x_col not in df.columns or y_col not in df.columns:
-                continue
-            df[x_col] = pd.to_numeric(df[x_col], errors='coerce')
-            df[y_col] = pd.to_numeric(df[y_col], errors='coerce')
-            label_name = os.path.splitext(os.path.basename(file_path))[0]
-            # 使用更柔和的点样式，避免每条曲线都显示 marker（影响大量点的渲染）
-            # 绘制曲线并增加小 marker（在点多时不会过于拥挤）
-            self.ax.plot(df[x_col], df[y_col], label=label_name, linewidth=2,
-                         marker='o', markersize=4, markeredgewidth=0.6, alpha=0.9)
-
-        # 局部样式设置（避免修改全局 rc）
-        self.ax.set_xlabel(f"{x_col}", fontsize=16, labelpad=8)
-        self.ax.set_ylabel(f"{y_col}", fontsize=16, labelpad=8)
+        self._highlight = None
+        self._crosshair = None
+        self._lod_lines = []
+        self._lod_xlim = None
+        self._plot_cols = None
+        self._legend_key = None
+        self._layout_key = None
+        self._pick_index = None
         # 主/次刻度样式：在四周都显示（top/right），刻度向内，适度加粗
         self.ax.tick_params(axis='both', which='major', labelsize=13, length=6, width=1.2,
                             direction='in', top=True, right=True)
@@ -1183,31 +2084,269 @@ class PlotApp(QMainWindow):
             self.ax.yaxis.set_ticks_position('both')
         except Exception:
             pass
-        # 将图例放在图外右侧，避免遮挡数据（如果图中曲线较少则自然放置）
-        # 将图例放回绘图区内部，使用自动最佳位置
-        try:
-            leg = self.ax.legend(fontsize=12, loc='best')
-        except Exception:
-            leg = self.ax.legend(fontsize=12)
         # 图例使用默认配色（主题仅为浅色），若需微调可在 style_light.qss 中修改
         self.ax.grid(True, linestyle='--', alpha=0.6)
-        # 让布局适应右侧图例
-        self.figure.tight_layout(rect=[0, 0, 0.92, 1])
-        self.canvas.draw()
+        self._axes_ready = True
+
+    #核心绘图函数：根据当前 loaded_files 更新曲线并统一样式
+    def _draw_all_files(self, x_col, y_col, autoscale=True):
+        # 延迟初始化 matplotlib 样式（仅首次绘图时执行）
+        _initialize_mpl_style()
+        if not self._axes_ready:
+            self._setup_axes()
+
+        # 数据变化后旧的高亮点已无意义；十字线暂时隐藏，避免参与自动缩放
+        self._remove_highlight()
+        if self._crosshair is not None:
+            for line in self._crosshair:
+                line.set_visible(False)
+
+        # 每个已加载文件对应一条曲线（self._lod_lines 与 loaded_files 按下标对齐），
+        # 已存在的曲线只用 set_data 更新数据，只为新增的文件创建曲线
+        entries = self._lod_lines
+        while len(entries) > len(self.loaded_files):
+            entry = entries.pop()
+            if entry is not None:
+                entry[0].remove()
+        n_cols = self._lod_columns()
+        for i, lf in enumerate(self.loaded_files):
+            entry = entries[i] if i < len(entries) else None
+            if i >= len(entries):
+                entries.append(None)
+            if not lf.has_numeric(x_col, y_col):
+                if entry is not None:
+                    entry[0].remove()
+                    entries[i] = None
+                continue
+            xs, ys, rows = self._line_data(lf, x_col, y_col)
+            self.memory.touch(lf)
+            label_name = lf.label
+            # 点数远多于像素列时只绘制每个像素列的 min/max 包络（保留尖峰），此时不画 marker
+            if len(xs):
+                dx, dy, reduced = minmax_decimate(xs, ys, np.min(xs), np.max(xs), n_cols)
+            else:
+                dx, dy, reduced = xs, ys, False
+            if entry is None:
+                # 绘制曲线并增加小 marker（在点多时不会过于拥挤）
+                line, = self.ax.plot(dx, dy, label=label_name, linewidth=2,
+                                     marker='None' if reduced else 'o',
+                                     markersize=4, markeredgewidth=0.6, alpha=0.9)
+                entries[i] = [line, xs, ys, rows]
+            else:
+                line = entry[0]
+                line.set_data(dx, dy)
+                line.set_marker('None' if reduced else 'o')
+                line.set_label(label_name)
+                entry[1], entry[2], entry[3] = xs, ys, rows
+        self._lod_xlim = None
+        self._data_version += 1
+
+        # 局部样式设置（避免修改全局 rc）
+        if self._plot_cols != (x_col, y_col):
+            self.ax.set_xlabel(f"{x_col}", fontsize=16, labelpad=8)
+            self.ax.set_ylabel(f"{y_col}", fontsize=16, labelpad=8)
+            self._plot_cols = (x_col, y_col)
+
+        if autoscale:
+            self.ax.relim(visible_only=True)
+            self.ax.autoscale(True)
+
+        # 图例条目有变化时才重建图例
+        legend_key = tuple((id(e[0]), e[0].get_label()) for e in entries if e is not None)
+        if legend_key != self._legend_key:
+            # 将图例放回绘图区内部，使用自动最佳位置
+            try:
+                leg = self.ax.legend(fontsize=12, loc='best')
+            except Exception:
+                leg = self.ax.legend(fontsize=12)
+            self._legend_key = legend_key
+
+        # 坐标轴标签或图例条目变化时才重新计算布局
+        layout_key = (x_col, y_col, tuple(label for _, label in legend_key))
+        if layout_key != self._layout_key:
+            # 让布局适应右侧图例
+            self.figure.tight_layout(rect=[0, 0, 0.92, 1])
+            self._layout_key = layout_key
+        # 按自动缩放后的坐标范围重新计算包络并重绘
+        self._request_render('lod')
 
         # 状态栏信息
         x_unicode = self.col_unicode_map.get(x_col, x_col)
         y_unicode = self.col_unicode_map.get(y_col, y_col)
         
         self.statusBar().showMessage(f"绘制完成: {y_unicode} vs {x_unicode}")
+
+    def _enforce_memory(self, budget_bytes=None):
+        """
+        常驻内存超出预算时换出最久未绘制的文件，返回被换出的文件数
+
+        图中曲线引用的是换出前的数组，先放开这些引用，原数组才能被释放；已画出的包络保留，
+        缩放、拾取等再用到完整数据时才由 _line_arrays 重新取得，不在这里立即重算处理流程。
+        """
+        if self._session_save is not None:
+            # 保存会话的线程正在读取各列存储，换出会修改这些列存储；保存完成后再检查
+            return 0
+        spilled = self.memory.enforce(self.loaded_files, budget_bytes)
+        if not spilled:
+            return 0
+        for lf, entry in zip(self.loaded_files, self._lod_lines):
+            if entry is not None and lf in spilled:
+                entry[1] = entry[2] = entry[3] = None
+        self._data_version += 1
+        print("已换出到磁盘:", [lf.name for lf in spilled])
+        return len(spilled)
+
+    def open_memory_view(self):
+        """内存诊断：各文件常驻内存和内存映射的数据量、最近绘制的先后"""
+        dlg = QDialog(self)
+        dlg.setWindowTitle("内存")
+        dlg.resize(720, 400)
+        layout = QVBoxLayout(dlg)
+        summary = QLabel()
+        layout.addWidget(summary)
+        table = QTableWidget(0, 4)
+        table.setHorizontalHeaderLabels(["文件", "常驻内存", "内存映射", "状态"])
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(table)
+
+        def fill():
+            rows = self.memory.report(self.loaded_files)
+            resident = sum(r['resident'] for r in rows)
+            mapped = sum(r['mapped'] for r in rows)
+            summary.setText(
+                f"常驻内存 {format_size(resident)} / 预算 {format_size(self.memory.budget_bytes)}，"
+                f"内存映射 {format_size(mapped)}，累计换出 {format_size(self.memory.spilled_bytes)}"
+                f"（按最近绘制的先后排列）")
+            table.setRowCount(len(rows))
+            for row, r in enumerate(rows):
+                lf = r['file']
+                if lf in self._followers:
+                    state = "跟随中（不换出）"
+                elif r['mapped'] and not r['resident']:
+                    state = f"已换出（{r['spills']} 次）"
+                elif r['last_used']:
+                    state = "常驻内存"
+                else:
+                    state = "尚未绘制"
+                for col, text in enumerate([lf.name, format_size(r['resident']), format_size(r['mapped']), state]):
+                    table.setItem(row, col, QTableWidgetItem(text))
+            table.resizeColumnsToContents()
+
+        def spill_all():
+            n = self._enforce_memory(budget_bytes=0)
+            self._request_render('lod')
+            self.statusBar().showMessage(f"已换出 {n} 个文件")
+            fill()
+
+        btn_layout = QHBoxLayout()
+        btn_refresh = QPushButton("刷新")
+        btn_spill = QPushButton("全部换出到磁盘")
+        btn_close = QPushButton("关闭")
+        btn_layout.addWidget(btn_refresh)
+        btn_layout.addWidget(btn_spill)
+        btn_layout.addWidget(btn_close)
+        layout.addLayout(btn_layout)
+        btn_refresh.clicked.connect(fill)
+        btn_spill.clicked.connect(spill_all)
+        btn_close.clicked.connect(dlg.accept)
+        fill()
+        dlg.exec()
+
+    def _line_data(self, lf, x_col, y_col):
+        """
+        处理流程输出中有效且未删除的点，返回 (xs, ys, 行位置)
+
+        只重算失效的处理步骤，未被处理的列直接引用原始数据；行位置是这些点在原始数据中的行号（全部有效时为 None）。
+        """
+        xs = lf.column(x_col)
+        ys = lf.column(y_col)
+        valid = ~(np.isnan(xs) | np.isnan(ys))
+        keep = lf.keep
+        if keep is not None:
+            valid &= keep
+        rows = None
+        if not valid.all():
+            rows = np.flatnonzero(valid)
+            xs, ys = xs[valid], ys[valid]
+        return xs, ys, rows
+
+    def _line_arrays(self, fi):
+        """第 fi 条曲线的完整数据 (xs, ys, 行位置)；换出时放开了引用的曲线在这里重新取得"""
+        entry = self._lod_lines[fi]
+        if entry[1] is None:
+            x_col, y_col = self._plot_cols
+            entry[1], entry[2], entry[3] = self._line_data(self.loaded_files[fi], x_col, y_col)
+        return entry[1], entry[2], entry[3]
+
+    def _lod_columns(self):
+        """绘图区的像素列数，决定降采样后每条曲线的点数"""
+        try:
+            return max(int(self.ax.bbox.width), 1)
+        except Exception:
+            return 1000
+
+    # 视图范围变化后，用完整数据重新计算当前 x 范围内的包络
+    def _update_lod(self, force=False):
+        if not self._lod_lines:
+            return
+        x0, x1 = sorted(self.ax.get_xlim())
+        n_cols = self._lod_columns()
+        key = (x0, x1, n_cols)
+        if not force and key == self._lod_xlim:
+            return
+        self._lod_xlim = key
+        for fi, entry in enumerate(self._lod_lines):
+            if entry is None:
+                continue
+            xs, ys, _ = self._line_arrays(fi)
+            if not len(xs):
+                continue
+            line = entry[0]
+            dx, dy, reduced = minmax_decimate(xs, ys, x0, x1, n_cols)
+            line.set_data(dx, dy)
+            line.set_marker('None' if reduced else 'o')
+
+    #压缩数据：真正移除已删除的点
+    def compact_data(self):
+        removed = merged = 0
+        for lf in self.loaded_files:
+            n, steps = lf.compact()
+            removed += n
+            merged += steps
+        if not removed:
+            self.statusBar().showMessage("没有需要压缩的已删除点")
+            return
+        # 压缩后行位置重新编号，之前的历史无法再对应；压缩前的列存储不再共享
+        self.history.clear()
+        self.shared_stores.retain([lf.store for lf in self.loaded_files])
+        self.replot_all(preserve_view=True)
+        msg = f"已移除 {removed} 个已删除的点（撤回历史已清空）"
+        if merged:
+            msg += f"，{merged} 个处理步骤已合并进数据"
+        self.statusBar().showMessage(msg)
+
+    def _update_history_actions(self):
+        self.action_undo.setEnabled(self.history.can_undo())
+        self.action_redo.setEnabled(self.history.can_redo())
+
     #撤回上一步操作
     def undo(self):
-        if self.history:
-            self.loaded_files = self.history.pop()
-            self.replot_all()
-            self.statusBar().showMessage("已撤回上一步操作")
-        else:
+        cmd = self.history.undo(self.loaded_files)
+        if cmd is None:
             self.statusBar().showMessage("没有可撤回的操作")
+            return
+        # 删除点的撤回保留当前视图，列变换的撤回重新自动缩放
+        self.replot_all(preserve_view=cmd.preserve_view)
+        self.statusBar().showMessage(f"已撤回：{cmd.name}")
+
+    #重做上一步撤回的操作
+    def redo(self):
+        cmd = self.history.redo(self.loaded_files)
+        if cmd is None:
+            self.statusBar().showMessage("没有可重做的操作")
+            return
+        self.replot_all(preserve_view=cmd.preserve_view)
+        self.statusBar().showMessage(f"已重做：{cmd.name}")
 
     #导出当前加载的数据到文件（Excel/CSV/TXT）
     def export_data(self):
@@ -1239,18 +2378,18 @@ class PlotApp(QMainWindow):
                     return
 
                 with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                    for i, (path, df) in enumerate(self.loaded_files):
-                        # sheet 名称不能太长，且不能重复
-                        sheet_name = f"{i}_{os.path.basename(path)[:20]}"
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
+                    for i, lf in enumerate(self.loaded_files):
+                        # sheet 名称不能太长、不能重复，也不能含有 []:*?/\ 等字符
+                        sheet_name = f"{i}_{lf.name[:20]}".translate(str.maketrans('[]:*?/\\', '()_____'))
+                        lf.output_df().to_excel(writer, sheet_name=sheet_name, index=False)
 
             else:
                 # CSV 或 TXT，合并到一个文件
                 sep = ',' if ext == '.csv' else '\t'
                 with open(file_path, 'w', encoding='utf-8') as f:
-                    for path, df in self.loaded_files:
-                        f.write(f"# 文件: {os.path.basename(path)}\n")
-                        df.to_csv(f, sep=sep, index=False)
+                    for lf in self.loaded_files:
+                        f.write(f"# 文件: {lf.name}\n")
+                        lf.output_df().to_csv(f, sep=sep, index=False)
                         f.write("\n\n")
 
             self.statusBar().showMessage(f"数据导出成功: {file_path}")
@@ -1313,43 +2452,132 @@ class PlotApp(QMainWindow):
         except Exception:
             pass
     # 深色主题支持已移除
-        # 强制重绘画布以立即反映浅色背景
-        try:
-            self.canvas.draw()
-        except Exception:
-            pass
+        # 重绘画布以反映浅色背景（与 replot_all 的重绘合并为一帧）
+        self._request_render('full')
         self.replot_all()
 
-#纵坐标对称以及归一化数据
-def center_data(Y):
-    Y = np.asarray(Y)
-    center_value = (np.nanmax(Y) + np.nanmin(Y)) / 2
-    centered_Y = Y - center_value
-    return centered_Y
-
-def normalize_data(Y, top_n=20):
-    Y = pd.to_numeric(Y, errors='coerce')
-    Y = np.asarray(Y)
-
-    valid_Y = Y[~np.isnan(Y)]
-
-    if len(valid_Y) == 0:
-        return Y, np.nan
-    if len(valid_Y) < top_n:
-        top_n = len(valid_Y)
-
-    top_n_avg = np.nanmean(np.partition(valid_Y, -top_n)[-top_n:])
-    if top_n_avg == 0:
-        return Y, top_n_avg
-
-    normalized_Y = np.where(Y > top_n_avg, 
-                            1, 
-                            np.where(Y < -top_n_avg, 
-                                     -1, 
-                                     Y / top_n_avg
-                                    )
-                           )
-    return normalized_Y, top_n_avg
+#最近点拾取：显示坐标下的均匀网格索引
+class DisplayGridIndex:
+    """
+    把当前视图内所有数据点按显示坐标分到边长为 cell_px 的网格中
+
+    查询时只检查点击位置所在网格及相邻的 8 个网格，只要容限不超过网格边长就不会漏掉点。
+    entries 为 [(文件下标, x 数组, y 数组)]，查询结果为 (文件下标, 点在数组中的位置)。
+    """
+
+    def __init__(self, ax, entries, cell_px):
+        self.cell = float(cell_px)
+        x0, y0, x1, y1 = ax.bbox.extents
+        # 视图外一个网格以内的点仍可能在容限内
+        self.origin = (x0 - self.cell, y0 - self.cell)
+        self.ny = int((y1 - y0) / self.cell) + 3
+        owners, positions, points = [], [], []
+        for fi, xs, ys in entries:
+            if not len(xs):
+                continue
+            pts = ax.transData.transform(np.column_stack((xs, ys)))
+            inside = ((pts[:, 0] >= x0 - self.cell) & (pts[:, 0] <= x1 + self.cell) &
+                      (pts[:, 1] >= y0 - self.cell) & (pts[:, 1] <= y1 + self.cell))
+            idx = np.flatnonzero(inside)
+            owners.append(np.full(len(idx), fi, dtype=np.intp))
+            positions.append(idx)
+            points.append(pts[idx])
+        if points:
+            owners = np.concatenate(owners)
+            positions = np.concatenate(positions)
+            points = np.concatenate(points)
+        else:
+            owners = positions = np.empty(0, dtype=np.intp)
+            points = np.empty((0, 2))
+        cells = self._cell_ids(points[:, 0], points[:, 1])
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.owners = owners[order]
+        self.positions = positions[order]
+        self.points = points[order]
+
+    def _cell_ids(self, xpix, ypix):
+        cx = np.floor((np.asarray(xpix) - self.origin[0]) / self.cell).astype(np.intp)
+        cy = np.floor((np.asarray(ypix) - self.origin[1]) / self.cell).astype(np.intp)
+        return cx * self.ny + cy
+
+    def query(self, xpix, ypix, tol):
+        """返回距离 (xpix, ypix) 不超过 tol 像素的最近点，没有则返回 None"""
+        if not len(self.cells):
+            return None
+        center = int(self._cell_ids(xpix, ypix))
+        best, best_dist = None, None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cid = center + dx * self.ny + dy
+                lo = np.searchsorted(self.cells, cid, side='left')
+                hi = np.searchsorted(self.cells, cid, side='right')
+                if lo == hi:
+                    continue
+                pts = self.points[lo:hi]
+                dists = np.hypot(pts[:, 0] - xpix, pts[:, 1] - ypix)
+                k = int(np.argmin(dists))
+                if dists[k] <= tol and (best_dist is None or dists[k] < best_dist):
+                    best, best_dist = lo + k, float(dists[k])
+        if best is None:
+            return None
+        return int(self.owners[best]), int(self.positions[best])
+
+#绘图降采样：按像素列保留 min/max 包络
+def _segment_first(hit, seg, default):
+    """每段中第一个 hit 为 True 的位置（seg 是各点所属的段号）；没有时取 default 中该段的值"""
+    idx = default.copy()
+    pos = np.flatnonzero(hit)
+    if len(pos):
+        first = np.r_[True, seg[pos[1:]] != seg[pos[:-1]]]
+        idx[seg[pos[first]]] = pos[first]
+    return idx
+
+def minmax_decimate(x, y, x0, x1, n_cols):
+    """
+    将曲线压缩为每个像素列的 min/max 包络，返回 (x, y, 是否做了压缩)
+
+    按数据顺序把落在同一像素列内的连续点合并为一段，每段只保留首点、最小值、最大值和末点
+    （最小值和最大值位于各自的 x 处），因此尖峰不会丢失，回线等 x 非单调的数据也保持原有的连线顺序。
+    视图外的点归入两侧的虚拟列，保证曲线在边界处仍能正确连出。
+    """
+    n = len(x)
+    if n <= 4 * n_cols or not x1 > x0:
+        return x, y, False
+
+    col = np.floor((x - x0) * (n_cols / (x1 - x0)))
+    np.clip(col, -1, n_cols, out=col)
+    starts = np.flatnonzero(np.r_[True, col[1:] != col[:-1]])
+    if len(starts) > 2 * n_cols:
+        # x 在像素列之间来回跳动（如噪声很大的数据），改为按数据顺序等分成固定数量的段
+        starts = np.unique(np.linspace(0, n, 2 * n_cols, endpoint=False).astype(np.intp))
+    ends = np.r_[starts[1:], n] - 1
+    lengths = ends - starts + 1
+
+    # 最小值、最大值各自画在它们自己的 x 处，并按在数据中的先后排列（x 来回跳动时段内的 x 并不接近首末点）
+    y_min = np.minimum.reduceat(y, starts)
+    y_max = np.maximum.reduceat(y, starts)
+    seg = np.repeat(np.arange(len(starts)), lengths)
+    i_min = _segment_first(y == y_min[seg], seg, starts)
+    i_max = _segment_first(y == y_max[seg], seg, ends)
+    min_first = i_min <= i_max
+
+    out_x = np.empty((len(starts), 4))
+    out_y = np.empty((len(starts), 4))
+    out_x[:, 0], out_y[:, 0] = x[starts], y[starts]
+    out_x[:, 1] = x[np.where(min_first, i_min, i_max)]
+    out_y[:, 1] = np.where(min_first, y_min, y_max)
+    out_x[:, 2] = x[np.where(min_first, i_max, i_min)]
+    out_y[:, 2] = np.where(min_first, y_max, y_min)
+    out_x[:, 3], out_y[:, 3] = x[ends], y[ends]
+    # 只有 1~2 个点的段直接保留原始点
+    keep = np.ones((len(starts), 4), dtype=bool)
+    keep[:, 1:3] = (lengths >= 3)[:, None]
+    keep[:, 3] = lengths >= 2
+
+    in_view = (col[starts] >= 0) & (col[starts] < n_cols)
+    reduced = bool(np.any(lengths[in_view] >= 3))
+    return out_x[keep], out_y[keep], reduced
 
 if __name__ == "__main__":
     # 启用高 DPI 支持（必须在创建 QApplication 之前设置）
@@ -0,0 +1,123 @@
+# compressed.py
+"""
+压缩的数据文件：gzip、xz、bz2 按文件头字节识别，读取时边读边解压，不写临时文件
+
+zip 压缩包中的每个数据文件作为一组数据读取，成员用 "压缩包路径::成员名" 表示（见 member_path），
+读取器和按列重新解析都通过 InputFile 打开，普通文件、压缩文件和压缩包成员的读法完全相同。
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import zipfile
+
+# 文件头字节 -> 压缩格式
+COMPRESSION_MAGIC = {
+    b'\x1f\x8b': 'gzip',
+    b'\xfd7zXZ\x00': 'xz',
+    b'BZh': 'bz2',
+}
+ZIP_MAGIC = b'PK\x03\x04'
+# 压缩包路径与成员名之间的分隔
+MEMBER_SEP = '::'
+# 压缩包中不作为数据读取的成员（macOS 打包时附带的资源文件等）
+SKIP_MEMBER_PREFIXES = ('__MACOSX/',)
+
+
+def member_path(archive, member):
+    """zip 压缩包中某个成员的路径表示"""
+    return f"{archive}{MEMBER_SEP}{member}"
+
+
+def split_member(path):
+    """拆分为 (压缩包路径, 成员名)；普通文件返回 (path, None)"""
+    if MEMBER_SEP in path and not os.path.exists(path):
+        archive, member = path.split(MEMBER_SEP, 1)
+        if os.path.isfile(archive):
+            return archive, member
+    return path, None
+
+
+def detect_compression(head):
+    """按文件头字节判断压缩格式（gzip/xz/bz2），不是压缩文件时返回 None"""
+    for magic, kind in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def archive_members(path):
+    """
+    path 是 zip 压缩包时返回其中的数据文件名列表，否则返回 None
+
+    xlsx 等 Office 文档本身也是 zip 压缩包（包含 [Content_Types].xml），不当作压缩包展开。
+    """
+    with open(path, 'rb') as fh:
+        if fh.read(len(ZIP_MAGIC)) != ZIP_MAGIC:
+            return None
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = zf.namelist()
+    except zipfile.BadZipFile:
+        return None
+    if '[Content_Types].xml' in names:
+        return None
+    return [n for n in names
+            if not n.endswith('/') and not n.startswith(SKIP_MEMBER_PREFIXES)
+            and not os.path.basename(n).startswith('.')]
+
+
+class InputFile:
+    """
+    以二进制方式打开数据文件用于流式读取：压缩文件透明解压，zip 成员直接从压缩包中读取
+
+    fh 是解压后的数据流；position() / total 给出读取进度（压缩文件按已读取的压缩字节计算）。
+    """
+
+    def __init__(self, path):
+        archive, member = split_member(path)
+        self.raw = open(archive, 'rb')
+        self.compression = None
+        self._zip = None
+        try:
+            if member is not None:
+                self.compression = 'zip'
+                self._zip = zipfile.ZipFile(self.raw)
+                self.fh = self._zip.open(member)
+                self.total = self._zip.getinfo(member).file_size or 1
+                return
+            self.total = os.fstat(self.raw.fileno()).st_size or 1
+            self.compression = detect_compression(self.raw.read(6))
+            self.raw.seek(0)
+            if self.compression == 'gzip':
+                self.fh = gzip.GzipFile(fileobj=self.raw, mode='rb')
+            elif self.compression == 'xz':
+                self.fh = lzma.LZMAFile(self.raw)
+            elif self.compression == 'bz2':
+                self.fh = bz2.BZ2File(self.raw)
+            else:
+                self.fh = self.raw
+        except Exception:
+            self.close()
+            raise
+
+    def position(self):
+        """已读取的字节数（与 total 对应）"""
+        if self.compression == 'zip':
+            return self.fh.tell()
+        return self.raw.tell()
+
+    def close(self):
+        fh = getattr(self, 'fh', None)
+        if fh is not None and fh is not self.raw:
+            fh.close()
+        if self._zip is not None:
+            self._zip.close()
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
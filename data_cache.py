@@ -0,0 +1,247 @@
+# data_cache.py
+"""解析结果的磁盘缓存：按 (绝对路径, 文件大小, 修改时间, 解析器版本) 缓存已解析的数据"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.instplot', 'cache')
+DEFAULT_CACHE_MB = 2048
+_META_NAME = 'meta.json'
+
+
+def _save_column(folder, i, arr, numeric):
+    """把第 i 列保存为 c{i}.npy（非数值列存为字符串数组，另存缺失值掩码 c{i}_na.npy），返回列类型"""
+    if numeric:
+        np.save(os.path.join(folder, f"c{i}.npy"), arr)
+        return 'num'
+    missing = pd.isna(arr)
+    np.save(os.path.join(folder, f"c{i}.npy"), np.asarray(arr).astype(str))
+    np.save(os.path.join(folder, f"c{i}_na.npy"), missing)
+    return 'str'
+
+
+def _dir_bytes(folder):
+    """目录中文件的总字节数（不含子目录）"""
+    return sum(e.stat().st_size for e in os.scandir(folder) if e.is_file())
+
+
+class ParsedDataCache:
+    """
+    解析结果缓存
+
+    每个缓存项是缓存目录下的一个子目录：meta.json 记录列名与读取信息，
+    每列保存为一个 .npy 文件（二进制列存储，读取时无需再解析文本，并且可以只读取用到的列）。
+    总大小超过上限时按最近使用时间（meta.json 的修改时间）淘汰最久未用的缓存项。
+    总大小只在第一次写入时扫描一次缓存目录，之后按每次写入的字节数累加，超过上限时才重新扫描并淘汰。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024, version='1'):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = int(max_bytes)
+        self.version = str(version)
+        self._lock = threading.Lock()
+        self._total = None  # 缓存目录的总字节数（尚未扫描时为 None）
+
+    def key_for(self, path, variant=''):
+        """
+        根据文件路径、大小、修改时间和解析器版本生成缓存键，文件不存在时返回 None
+
+        variant 区分同一文件的不同读取结果（读取选项不同，或一个文件包含多组数据时的各组）。
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{self.version}"
+        if variant:
+            raw += f"|{variant}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, path, variant=''):
+        """
+        命中时返回 (缓存项目录, meta)，否则返回 None；列数据不在这里读取，由 load_column 按需读取
+
+        包含多组数据的文件命中的是目录项，meta['parts'] 为组数，各组以 variant|序号 分别缓存。
+        """
+        key = self.key_for(path, variant)
+        if key is None:
+            return None
+        entry = os.path.join(self.cache_dir, key)
+        meta_path = os.path.join(entry, _META_NAME)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            # 更新使用时间，用于 LRU 淘汰
+            os.utime(meta_path, None)
+        except Exception:
+            return None
+        return entry, meta
+
+    @staticmethod
+    def load_column(entry, i, kind):
+        """
+        读取缓存项中的第 i 列：以内存映射方式打开 .npy，只把这一列复制到内存
+
+        缓存项已被淘汰时抛出 OSError。
+        """
+        mm = np.load(os.path.join(entry, f"c{i}.npy"), mmap_mode='r', allow_pickle=False)
+        if kind == 'str':
+            missing = np.load(os.path.join(entry, f"c{i}_na.npy"), allow_pickle=False)
+            arr = np.asarray(mm).astype(object)
+            arr[missing] = np.nan
+        else:
+            arr = np.array(mm)
+        del mm
+        return arr
+
+    def put(self, path, df, enc_used, chosen_sep, source=None, columns=None, numeric=None, variant=''):
+        """
+        写入缓存（先写到临时目录再改名，避免并发读到不完整的缓存项）
+
+        source 记录原文件的读取方式，缓存项被淘汰后可据此只重新解析某一列。
+        df 只包含部分列时，columns/numeric 给出文件的全部列名和数值标记，df 的列按列名对应；
+        没有写入的列读取时抛出 OSError，由调用方重新解析。
+        成功时返回 (缓存项目录, meta)，否则返回 None。
+        """
+        key = self.key_for(path, variant)
+        if key is None or self.max_bytes <= 0:
+            return None
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.exists(entry):
+            return self.lookup(path, variant)
+        tmp = f"{entry}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            if columns is None:
+                columns = list(df.columns)
+                numeric = [dt.kind in 'biuf' for dt in df.dtypes]
+            positions = {col: i for i, col in enumerate(df.columns)}
+            kinds = []
+            for i, col in enumerate(columns):
+                if col not in positions:
+                    kinds.append('num' if numeric[i] else 'str')
+                    continue
+                series = df.iloc[:, positions[col]]
+                kinds.append(_save_column(tmp, i, series.to_numpy(), series.dtype.kind in 'biuf'))
+            meta = {
+                'path': os.path.abspath(path),
+                'columns': [str(c) for c in columns],
+                'kinds': kinds,
+                'n_rows': len(df),
+                'encoding': enc_used,
+                'sep': chosen_sep,
+                'source': source,
+            }
+            with open(os.path.join(tmp, _META_NAME), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            added = _dir_bytes(tmp)
+            os.replace(tmp, entry)
+        except Exception as e:
+            print("写入缓存失败:", e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return None
+        self._added(added)
+        return entry, meta
+
+    def put_columns(self, entry, arrays):
+        """
+        把之后重新解析的列补写入已有的缓存项（arrays 为 {列位置: 数组}），下次直接从缓存读取
+
+        只用于 put 时没有写入的列；缓存项已被淘汰时不做任何事。每列先写临时文件再改名，不影响正在读取的进程。
+        """
+        if not os.path.isfile(os.path.join(entry, _META_NAME)):
+            return
+        added = 0
+        try:
+            for i, arr in arrays.items():
+                tmp = f"{entry}{os.sep}.tmp-{os.getpid()}-{threading.get_ident()}"
+                os.makedirs(tmp, exist_ok=True)
+                try:
+                    _save_column(tmp, i, arr, arr.dtype.kind in 'biuf')
+                    added += _dir_bytes(tmp)
+                    for name in os.listdir(tmp):
+                        os.replace(os.path.join(tmp, name), os.path.join(entry, name))
+                finally:
+                    shutil.rmtree(tmp, ignore_errors=True)
+        except OSError as e:
+            print("写入缓存失败:", e)
+        self._added(added)
+
+    def put_parts(self, path, variant, n_parts, skipped=()):
+        """
+        写入多组数据的目录项（各组已用 variant|序号 写入），之后 lookup(path, variant) 可以命中
+
+        skipped 是读取时跳过的部分（如工作表名），命中时从 meta['skipped'] 取回。
+        """
+        key = self.key_for(path, variant)
+        if key is None or self.max_bytes <= 0:
+            return
+        entry = os.path.join(self.cache_dir, key)
+        tmp = f"{entry}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            with open(os.path.join(tmp, _META_NAME), 'w', encoding='utf-8') as f:
+                json.dump({'path': os.path.abspath(path), 'parts': n_parts, 'skipped': list(skipped)}, f,
+                          ensure_ascii=False)
+            added = _dir_bytes(tmp)
+            if os.path.exists(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except Exception as e:
+            print("写入缓存失败:", e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._added(added)
+
+    def _entries(self):
+        """列出缓存项：[(最近使用时间, 大小, 目录)]"""
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return entries
+        for name in names:
+            entry = os.path.join(self.cache_dir, name)
+            meta_path = os.path.join(entry, _META_NAME)
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                size = _dir_bytes(entry)
+                entries.append((os.path.getmtime(meta_path), size, entry))
+            except OSError:
+                continue
+        return entries
+
+    def _added(self, nbytes):
+        """记录新写入的字节数；累计总大小超过上限时才扫描缓存目录并淘汰"""
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._entries())
+            else:
+                self._total += nbytes
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """扫描缓存目录，总大小超过上限时按 LRU 顺序删除缓存项"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+            self._total = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, entry in self._entries():
+                shutil.rmtree(entry, ignore_errors=True)
+            self._total = 0
@@ -0,0 +1,1216 @@
+# data_loader.py
+"""数据文件解析：分块流式读取文本数据，避免整文件读入内存"""
+
+import io
+import os
+import json
+import re
+import csv
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+import pandas as pd
+from data_store import ColumnStore
+from readers import register_reader, find_reader, get_reader
+from compressed import InputFile, ZIP_MAGIC, archive_members, member_path
+
+# 解析器版本：解析结果的格式或内容发生变化时递增，使旧的磁盘缓存失效
+LOADER_VERSION = '7'
+# 每个分块的行数：块越大解析越快，但单块占用内存越多
+CHUNK_ROWS = 200_000
+# VSM 文件读取时只解析两三列，每块占用的内存很小，用更大的块减少分块开销
+VSM_CHUNK_ROWS = 1_000_000
+# 嗅探阶段读取的文件头大小（字节）
+HEAD_BYTES = 64 * 1024
+# 候选编码（按优先级），chardet 的检测结果会插在最前面
+ENCODING_CANDIDATES = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'gbk', 'big5', 'mac_roman']
+# 候选分隔符
+SEP_CANDIDATES = ['\t', ',', ';', r'\s+']
+# VSM 数据块可能使用的分隔符（按优先级）
+VSM_SEPARATORS = [',', '\t', ';', r'\s+']
+# 数据块之前的标记行（不作为头信息保存）
+VSM_DATA_MARKERS = ('[data]', '##data table', '@@data', 'data:', '[measured data]')
+# 识别不出数据块时的固定读取方式：跳过的头信息行数，以及读取的原始列（Bz 和 emu）
+VSM_SKIPROWS = 31
+VSM_COLUMNS = [3, 4]
+VSM_DEFAULT_NAMES = ['B (Oe)', 'M (emu)']
+# 固定宽度文件：推断列边界用的样本行数、每次转换的字节数，以及插入的分隔符（不会出现在文本数据中）
+FWF_SAMPLE_ROWS = 200
+FWF_CHUNK_BYTES = 8 * 1024 * 1024
+FWF_DELIM = '\x1f'
+# Excel 文件的文件头：xls 是 OLE 复合文档，xlsx 是 zip 压缩包（ZIP_MAGIC）
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+EXCEL_EXTS = ('.xls', '.xlsx', '.xlsm')
+# Quantum Design（PPMS/MPMS）.dat 文件的段标记
+QD_HEADER_MARK = '[header]'
+QD_DATA_MARK = '[data]'
+# 并行解析 zip 压缩包中各个数据文件的线程数上限
+ARCHIVE_WORKERS = 8
+# 计算内容哈希时每次读取的字节数
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+class LoadCancelled(Exception):
+    """读取过程被用户取消（由进度回调抛出）"""
+
+
+class Parts(list):
+    """多组数据的读取结果（列表），skipped 记录读取时跳过的部分，如不包含所选列的工作表名"""
+
+    def __init__(self, items=(), skipped=()):
+        super().__init__(items)
+        self.skipped = list(skipped)
+
+
+def read_head(path, size=HEAD_BYTES):
+    """读取文件开头的一小段字节（压缩文件为解压后的内容），供所有嗅探逻辑共用"""
+    with InputFile(path) as inp:
+        return inp.fh.read(size)
+
+
+def read_input_head(path):
+    """读取文件头（压缩文件为解压后的内容），返回 (文件头, 压缩格式)；格式判断和各读取器共用这一次读取"""
+    with InputFile(path) as inp:
+        return inp.fh.read(HEAD_BYTES), inp.compression
+
+
+def detect_encoding(head):
+    """根据文件头字节选择能够正确解码的编码，返回 (编码, 解码后的文本)"""
+    if head[:5000].isascii():
+        # 纯 ASCII 时 chardet 的结果必然是 ascii，不必调用（仪器文件很常见，可省下几十毫秒）
+        detected = 'ascii'
+    else:
+        try:
+            import chardet
+            detected = chardet.detect(head[:5000]).get('encoding')
+        except ImportError:
+            detected = None
+    if detected and detected.lower() == 'ascii':
+        # 文件头是纯 ASCII 时按 UTF-8 读取（后者兼容前者），避免后面的非 ASCII 字符被替换
+        detected = 'utf-8'
+
+    # 文件头可能截断在多字节字符中间，只检查到最后一个换行符为止
+    cut = head.rfind(b'\n')
+    sample = head[:cut + 1] if cut >= 0 else head
+    for enc in [detected] + ENCODING_CANDIDATES:
+        if not enc:
+            continue
+        try:
+            return enc, sample.decode(enc)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return None, None
+
+
+def detect_separator(header_line, data_line):
+    """比较表头行与数据行的列数来确定分隔符，失败返回 None"""
+    for sep in SEP_CANDIDATES:
+        if sep == r'\s+':
+            hcols = re.split(r'\s+', header_line.strip())
+            dcols = re.split(r'\s+', data_line.strip())
+        else:
+            hcols = header_line.split(sep)
+            dcols = data_line.split(sep)
+        if len(hcols) > 1 and len(hcols) == len(dcols):
+            return sep
+    return None
+
+
+def _split_fields(line, sep):
+    if sep == r'\s+':
+        return line.split()
+    return [f.strip() for f in line.split(sep)]
+
+
+def _numeric_fields(line, sep):
+    """按 sep 分割后各字段都是数值（允许空字段）时返回字段数，否则返回 0"""
+    fields = _split_fields(line, sep)
+    if len(fields) < 2 or not any(fields):
+        return 0
+    for f in fields:
+        if f:
+            try:
+                float(f)
+            except ValueError:
+                return 0
+    return len(fields)
+
+
+def _unique_names(names):
+    """空列名用列序号代替，重复的列名加上 .1、.2 后缀（与 pandas 读取表头时一致）"""
+    out = []
+    seen = {}
+    for k, name in enumerate(names):
+        name = name or f"列{k + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        out.append(name)
+    return out
+
+
+def _vsm_axes(names):
+    """默认的 X/Y 列：按列名找磁场和磁矩，找不到时取原来固定读取的第 4、5 列"""
+    lower = [n.lower() for n in names]
+    x = next((n for n, l in zip(names, lower) if '(oe)' in l or 'field' in l), None)
+    y = next((n for n, l in zip(names, lower) if '(emu)' in l or 'moment' in l), None)
+    if x is None or y is None:
+        if len(names) <= max(VSM_COLUMNS):
+            return None
+        x, y = (names[i] for i in VSM_COLUMNS)
+    return [x, y]
+
+
+def parse_vsm_header(text):
+    """
+    从文件头文本中找到 VSM 数据块，返回读取方式（分隔符、跳过的行数、列名）和头信息；找不到时返回 None
+
+    数据块是文件头末尾连续的数值行：由最后一个数值行确定分隔符和列数，向前找到第一个不符合的非空行，
+    列数相同时它就是列名行。再往前的 "键,值" 行（标记行除外）作为头信息保存。
+    """
+    lines = text.split('\n')
+    last = None
+    for end in range(len(lines) - 1, -1, -1):
+        if not lines[end].strip():
+            continue
+        for sep in VSM_SEPARATORS:
+            ncols = _numeric_fields(lines[end], sep)
+            if ncols:
+                last = (end, sep, ncols)
+                break
+        if last is not None:
+            break
+    if last is None:
+        return None
+
+    end, sep, ncols = last
+    data_row = end
+    i = end - 1
+    while i >= 0:
+        if lines[i].strip():
+            if _numeric_fields(lines[i], sep) != ncols:
+                break
+            data_row = i
+        i -= 1
+
+    names = None
+    meta_end = data_row
+    if i >= 0:
+        fields = _split_fields(lines[i], sep)
+        if len(fields) == ncols:
+            names = fields
+            meta_end = i
+    if names is None:
+        # 没有列名行：沿用原来的列名
+        names = [''] * ncols
+        if ncols > max(VSM_COLUMNS):
+            for k, name in zip(VSM_COLUMNS, VSM_DEFAULT_NAMES):
+                names[k] = name
+    names = _unique_names([fix_garbled(clean_col_name(n)) for n in names])
+
+    header = {}
+    for line in lines[:meta_end]:
+        line = line.strip()
+        if not line or line.lower() in VSM_DATA_MARKERS:
+            continue
+        parts = re.split(r'\s*[,:=\t]\s*', line, maxsplit=1)
+        header[parts[0]] = parts[1] if len(parts) > 1 else ''
+    return {'sep': sep, 'data_row': data_row, 'names': names, 'usecols': None,
+            'axes': _vsm_axes(names), 'header': header}
+
+
+def block_layout(source):
+    """
+    VSM、QD 等 "头信息 + 数据块" 文件的 (分隔符, 跳过的行数, 读取的原始列)
+
+    缺少的项（旧版会话中的 VSM 文件）按 VSM 的固定读取方式补齐。
+    """
+    return (source.get('sep', ','), source.get('data_row', VSM_SKIPROWS),
+            source.get('usecols', VSM_COLUMNS))
+
+
+def _qd_axes(names):
+    """QD 文件默认的 X/Y 列：磁场（没有时为温度），磁矩或电阻"""
+    lower = [n.lower() for n in names]
+    x = (next((n for n, l in zip(names, lower) if 'field' in l), None)
+         or next((n for n, l in zip(names, lower) if l.startswith('temperature')), None))
+    y = next((n for n, l in zip(names, lower) if 'moment' in l or 'resist' in l), None)
+    if x is None or y is None:
+        return None
+    return [x, y]
+
+
+def parse_qd_header(path, encoding):
+    """
+    Quantum Design（PPMS/MPMS）.dat 文件：[Header] 段是元数据，[Data] 之后是列名行和逗号分隔的数据
+
+    只逐行读到列名行为止。返回读取方式（跳过的行数、读取的原始列）、列名和头信息；
+    哪些列全空要解析完整个文件才能确定，由 read_qd_file 处理。
+    """
+    header = {}
+    line_no = 0
+    with InputFile(path) as inp:
+        fh = inp.fh
+        for raw in fh:
+            line_no += 1
+            line = raw.decode(encoding, errors='replace').strip()
+            if line.lower() == QD_DATA_MARK:
+                break
+            if not line or line.startswith(';') or line.lower() == QD_HEADER_MARK:
+                continue
+            fields = [f.strip() for f in next(csv.reader([line]))]
+            if fields[0].upper() == 'INFO' and len(fields) >= 3:
+                # INFO,值,名称
+                key, value = fields[2], fields[1]
+            else:
+                key, value = fields[0], ', '.join(fields[1:])
+            header[key] = f"{header[key]}; {value}" if key in header else value
+        else:
+            raise ValueError("QD 文件中没有 [Data] 段")
+
+        names_line = fh.readline()
+        line_no += 1
+        names = [fix_garbled(clean_col_name(n))
+                 for n in next(csv.reader([names_line.decode(encoding, errors='replace').strip()]), [])]
+        if not names:
+            raise ValueError("QD 文件 [Data] 段缺少列名行")
+
+    usecols = list(range(len(names)))
+    # Comment 列绝大部分为空，直接按文本读取，避免 C 引擎逐块推断类型
+    text_cols = [k for k in usecols if names[k].lower() == 'comment']
+    names = _unique_names([names[k] for k in usecols])
+    return {'sep': ',', 'data_row': line_no, 'names': names, 'usecols': usecols,
+            'text_cols': text_cols, 'axes': _qd_axes(names), 'header': header}
+
+
+def decode_head(head):
+    """确定文件头的编码，返回 (编码, 解码后的文本)；失败时抛出 ValueError"""
+    encoding, text = detect_encoding(head)
+    if encoding is None:
+        raise ValueError("无法用常见编码读取文件")
+    return encoding, text
+
+
+def sniff_file(path, head=None):
+    """
+    单次嗅探：只读取一次文件头，从中判断编码、分隔符和表头所在行
+
+    返回字典：
+        encoding   - 解码所用编码
+        sep        - 分隔符（None 表示需要按固定宽度解析）
+        header_row - 表头所在的行号（此前的行均为空行）
+    """
+    if head is None:
+        head = read_head(path)
+
+    encoding, text = decode_head(head)
+    info = {'encoding': encoding, 'sep': None, 'header_row': 0}
+
+    all_lines = text.splitlines()
+    nonempty = [(i, ln) for i, ln in enumerate(all_lines) if ln.strip()][:2]
+    if not nonempty:
+        raise ValueError("文件为空或只包含空行")
+    info['header_row'] = nonempty[0][0]
+    header_line = nonempty[0][1]
+    data_line = nonempty[1][1] if len(nonempty) > 1 else header_line
+    info['sep'] = detect_separator(header_line, data_line)
+    return info
+
+
+class ColumnBuffers:
+    """
+    逐块累积解析结果：每列写入预留了增长空间的 NumPy 数组，一块写完即可释放，不需要最后再拼接所有块
+
+    数值转换也逐块完成（规则与 to_numeric_columns 相同：能转换为数值的值不少于一半的列为数值列），
+    峰值内存约为最终数组加一块。到目前为止全为空的列不分配数组，出现第一个值时才分配并补齐前面的 NaN；
+    drop_empty 为 True 时，读完后仍未分配的列（整个文件都为空）不出现在结果中。
+    """
+
+    def __init__(self, drop_empty=False):
+        self.drop_empty = drop_empty
+        self.columns = None
+        self.n_rows = 0
+        self._capacity = 0
+        self._num = {}  # 列位置 -> float64 数组
+        self._obj = {}  # 列位置 -> object 数组（出现过非数值类型的块时才有，保存原始值）
+        self._present = {}  # 列位置 -> 非空值个数
+        self._numeric = {}  # 列位置 -> 能转换为数值的值的个数
+
+    def _grow(self, n):
+        capacity = max(n, self._capacity + self._capacity // 2)
+        for bufs in (self._num, self._obj):
+            for k, buf in bufs.items():
+                grown = np.empty(capacity, dtype=buf.dtype)
+                grown[:self.n_rows] = buf[:self.n_rows]
+                bufs[k] = grown
+        self._capacity = capacity
+
+    def add(self, chunk, expected_rows=None):
+        """追加一块（DataFrame）；expected_rows 是估计的总行数，用于第一次分配数组时预留空间"""
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        start = self.n_rows
+        end = start + len(chunk)
+        if end > self._capacity:
+            if not self._capacity and expected_rows:
+                self._capacity = max(end, int(expected_rows * 1.05))
+            else:
+                self._grow(end)
+        for k in range(chunk.shape[1]):
+            series = chunk.iloc[:, k]
+            if series.dtype.kind in 'biuf':
+                values = series.to_numpy(dtype=float, na_value=np.nan)
+                n_present = n_numeric = int(np.count_nonzero(~np.isnan(values)))
+                raw = None
+            else:
+                n_present = int(series.notna().sum())
+                values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+                n_numeric = int(np.count_nonzero(~np.isnan(values)))
+                raw = series.to_numpy(dtype=object)
+            num = self._num.get(k)
+            if num is None:
+                if not n_present:
+                    continue
+                num = self._num[k] = np.empty(self._capacity)
+                num[:start] = np.nan
+                self._present[k] = self._numeric[k] = 0
+            num[start:end] = values
+            self._present[k] += n_present
+            self._numeric[k] += n_numeric
+            obj = self._obj.get(k)
+            if raw is not None and obj is None:
+                obj = self._obj[k] = np.empty(self._capacity, dtype=object)
+                obj[:start] = num[:start]
+            if obj is not None:
+                obj[start:end] = values if raw is None else raw
+        self.n_rows = end
+
+    def frame(self):
+        """组装结果（DataFrame，各列为连续数组，不再复制）；逐列截去预留的空间，原缓冲区随即释放"""
+        n = self.n_rows
+        data = {}
+        for k in range(len(self.columns or ())):
+            num = self._num.pop(k, None)
+            obj = self._obj.pop(k, None)
+            if num is None:
+                if self.drop_empty:
+                    continue
+                data[k] = np.full(n, np.nan)
+                continue
+            numeric = obj is None or (self._numeric[k] and self._numeric[k] * 2 >= self._present[k])
+            arr = num if numeric else obj
+            del num, obj
+            data[k] = arr[:n].copy() if len(arr) != n else arr
+            del arr
+        out = pd.DataFrame(data, copy=False)
+        out.columns = [self.columns[k] for k in data]
+        return out
+
+
+def read_csv_chunked(path, sep, encoding, progress_cb=None, chunksize=CHUNK_ROWS, drop_empty=False, **kwargs):
+    """
+    使用 C 解析引擎按块读取分隔符文本文件
+
+    文件以二进制方式打开（压缩文件边读边解压），每解析完一块就通过 progress_cb(已读字节, 总字节) 汇报进度。
+    每块在读取下一块之前就转换为数值并写入各列的数组（见 ColumnBuffers），然后释放，
+    峰值内存约为最终数组加一块；drop_empty 为 True 时丢弃整个文件中都没有数据的列。
+    """
+    buffers = ColumnBuffers(drop_empty)
+    with InputFile(path) as inp:
+        reader = pd.read_csv(inp.fh, sep=sep, encoding=encoding, engine='c',
+                             chunksize=chunksize, **kwargs)
+        with reader:
+            for chunk in reader:
+                # 按第一块占用的字节数估计总行数，数组一次分配到位，多数情况下不必再扩大
+                done = inp.position()
+                expected = len(chunk) * inp.total // done if done else None
+                buffers.add(chunk, expected)
+                del chunk
+                if progress_cb is not None:
+                    progress_cb(inp.position(), inp.total)
+
+    if buffers.columns is None:
+        # 只有表头没有数据行
+        with InputFile(path) as inp:
+            return pd.read_csv(inp.fh, sep=sep, encoding=encoding, engine='c', nrows=0, **kwargs)
+    return buffers.frame()
+
+
+def infer_fwf_layout(head, encoding, header_row):
+    """
+    从文件头样本推断固定宽度文件的列边界，返回 {'cuts': 各列边界的字节位置, 'names': 列名}，样本中没有数据行时返回 None
+
+    所有样本数据行和表头行在某个位置都是空白时，该位置属于列间隔。样本只来自文件开头，后面的数值可能更宽：
+    右侧一列左对齐时以它的起点为界，左侧一列右对齐时以它的终点为界，都不是时取间隔的中点。
+    列名优先按两个以上的连续空白分割（列名本身可以含有单个空格），个数不符时再按列边界切分表头行。
+    """
+    lines = head.split(b'\n')[:-1]  # 最后一行可能不完整
+    if len(lines) <= header_row:
+        return None
+    header = lines[header_row].rstrip(b'\r')
+    sample = [ln.rstrip(b'\r') for ln in lines[header_row + 1:] if ln.strip()][:FWF_SAMPLE_ROWS]
+    if not sample:
+        return None
+
+    width = max(len(ln) for ln in sample + [header])
+    rows = np.zeros((len(sample), width), dtype=bool)  # 样本各行每个位置是否非空白
+    for r, ln in enumerate(sample):
+        b = np.frombuffer(ln, dtype=np.uint8)
+        rows[r, :len(b)] = (b != 32) & (b != 9)
+    hb = np.frombuffer(header, dtype=np.uint8)
+    filled = rows.any(axis=0)
+    filled[:len(hb)] |= (hb != 32) & (hb != 9)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], filled.astype(np.int8), [0]))))
+    runs = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if rows[:, start:end].any() or not runs:
+            runs.append([start, end])
+        else:
+            # 只有表头文字（列名比数值宽）的部分并入左侧一列
+            runs[-1][1] = end
+    if len(runs) > 1 and not rows[:, runs[0][0]:runs[0][1]].any():
+        runs[1][0] = runs.pop(0)[0]
+    starts, ends = [r[0] for r in runs], [r[1] for r in runs]
+
+    def aligned(col, pos):
+        # 该列有值的行在 pos 处都不是空白
+        present = rows[:, starts[col]:ends[col]].any(axis=1)
+        return present.any() and rows[present, pos].all()
+
+    cuts = []
+    for k in range(len(starts) - 1):
+        if aligned(k + 1, starts[k + 1]):
+            cuts.append(int(starts[k + 1]))
+        elif aligned(k, ends[k] - 1):
+            cuts.append(int(ends[k]))
+        else:
+            cuts.append(int(ends[k] + starts[k + 1]) // 2)
+
+    text = header.decode(encoding, errors='replace')
+    names = re.split(r'\s{2,}|\t', text.strip())
+    if len(names) != len(cuts) + 1:
+        bounds = [0] + cuts + [len(header)]
+        names = [header[a:b].decode(encoding, errors='replace').strip() for a, b in zip(bounds[:-1], bounds[1:])]
+    return {'cuts': cuts, 'names': _unique_names([fix_garbled(clean_col_name(n)) for n in names])}
+
+
+def insert_delimiters(data, cuts):
+    """
+    在每行的列边界处插入分隔符（NumPy 向量化），把固定宽度文本转换为 C 引擎可以解析的分隔符文本
+
+    data 必须以换行符结尾；比边界短的行不插入，缺少的列由解析器补为 NaN。
+    """
+    arr = np.frombuffer(data, dtype=np.uint8)
+    nl = np.flatnonzero(arr == 10)
+    if not len(nl) or not cuts:
+        return data
+    starts = np.concatenate(([0], nl[:-1] + 1))
+    ends = nl - (arr[np.maximum(nl - 1, 0)] == 13)  # 不包括 \r\n 中的 \r
+    pos = starts[:, None] + np.asarray(cuts, dtype=np.intp)[None, :]
+    return np.insert(arr, pos[pos < ends[:, None]], ord(FWF_DELIM)).tobytes()
+
+
+def read_fwf_chunked(path, encoding, header_row, cuts, progress_cb=None, usecols=None):
+    """
+    按已推断的列边界读取固定宽度文件：每块字节插入分隔符后交给 C 引擎解析，速度接近分隔符文件
+
+    比 pd.read_fwf 快数倍，且列宽只在嗅探时推断一次。
+    """
+    names = list(range(len(cuts) + 1))
+    buffers = ColumnBuffers()
+    with InputFile(path) as inp:
+        fh = inp.fh
+        for _ in range(header_row + 1):
+            fh.readline()
+        rest = b''
+        while True:
+            block = fh.read(FWF_CHUNK_BYTES)
+            data = rest + block
+            if block:
+                cut = data.rfind(b'\n')
+                data, rest = data[:cut + 1], data[cut + 1:]
+            elif data and not data.endswith(b'\n'):
+                data += b'\n'
+            if data.strip():
+                chunk = pd.read_csv(io.BytesIO(insert_delimiters(data, cuts)), sep=FWF_DELIM,
+                                    header=None, names=names, usecols=usecols, index_col=False,
+                                    skipinitialspace=True, encoding=encoding,
+                                    encoding_errors='replace', engine='c')
+                del data
+                # 文本列去掉补齐宽度用的空格
+                for i in range(chunk.shape[1]):
+                    if chunk.dtypes.iloc[i].kind not in 'biufc':
+                        chunk.iloc[:, i] = chunk.iloc[:, i].str.rstrip()
+                done = inp.position()
+                buffers.add(chunk, len(chunk) * inp.total // done if done else None)
+                del chunk
+                if progress_cb is not None:
+                    progress_cb(inp.position(), inp.total)
+            if not block:
+                break
+
+    if buffers.columns is None:
+        return pd.DataFrame({i: pd.Series(dtype=float) for i in (usecols or names)})
+    return buffers.frame()
+
+
+def clean_col_name(s):
+    """列名清理：去除首尾空白并合并连续空白"""
+    s = str(s).strip()
+    s = re.sub(r'\s+', ' ', s)
+    return s
+
+
+def fix_garbled(s: str) -> str:
+    """修复常见乱码"""
+    return (
+        s.replace('¦È', 'θ')
+        .replace('¡ã', '°')
+        .replace('¦¸', 'Ω')
+        .replace('Â', '')
+        .strip()
+    )
+
+
+def to_numeric_columns(df):
+    """
+    读取完成后一次性把各列转换为连续的 float64 数组
+
+    能转换为数值的值不少于一半的列视为数值列（个别无法转换的值变为 NaN），
+    其余列保持原样，作为非数值列不参与绘图和拾取。
+    """
+    data = {}
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        if series.dtype.kind in 'biuf':
+            data[i] = np.ascontiguousarray(series.to_numpy(dtype=float, na_value=np.nan))
+            continue
+        n_present = int(series.notna().sum())
+        converted = pd.to_numeric(series, errors='coerce')
+        n_numeric = int(converted.notna().sum())
+        if n_numeric and n_numeric * 2 >= n_present:
+            data[i] = np.ascontiguousarray(converted.to_numpy(dtype=float, na_value=np.nan))
+        else:
+            data[i] = series.to_numpy()
+    out = pd.DataFrame(data, copy=False)
+    out.columns = df.columns
+    return out
+
+
+def read_columns(path, source, indices):
+    """
+    只重新解析 indices 指定的列，返回与 indices 对齐的数组列表（没有磁盘缓存时，列在首次被选中时才读取）
+
+    source 是读取器记录的读取方式：format（csv/fwf/excel/vsm/qd 或第三方格式名）、sep、encoding、header_row 等；
+    zip 压缩包中的数据文件还记录了成员名 member。
+    """
+    indices = list(indices)
+    fmt = source['format']
+    if source.get('member'):
+        path = member_path(path, source['member'])
+    if fmt == 'excel':
+        with InputFile(path) as inp:
+            df = pd.read_excel(inp.fh, sheet_name=source.get('sheet', 0), header=0, usecols=indices,
+                               engine=excel_engine())
+    elif fmt in ('vsm', 'qd'):
+        sep, data_row, usecols = block_layout(source)
+        df = read_csv_chunked(path, sep, source.get('encoding'), skiprows=data_row, header=None,
+                              usecols=[usecols[i] for i in indices] if usecols else indices,
+                              dtype={k: object for k in source.get('text_cols', ())},
+                              index_col=False, encoding_errors='replace')
+    elif fmt == 'fwf' and 'cuts' in source:
+        df = read_fwf_chunked(path, source['encoding'], source['header_row'], source['cuts'],
+                              usecols=indices)
+    elif fmt == 'fwf':
+        # 旧版会话：没有记录列边界
+        df = pd.read_fwf(path, encoding=source['encoding'], skiprows=source['header_row'],
+                         usecols=indices, encoding_errors='replace')
+    elif fmt == 'csv':
+        df = read_csv_chunked(path, source['sep'], source['encoding'],
+                              skiprows=source['header_row'], usecols=indices,
+                              encoding_errors='replace')
+    else:
+        # 第三方格式：完整读取一遍，只取需要的列
+        read = get_reader(fmt)
+        if read is None:
+            raise ValueError(f"没有 {fmt} 格式的读取器")
+        parsed = read(path, read_head(path))
+        if isinstance(parsed, list):
+            parsed = next(p for p in parsed if p.get('part') == source.get('part'))
+        df = parsed if isinstance(parsed, pd.DataFrame) else parsed['df']
+        df = df.iloc[:, sorted(indices)]
+    # usecols 返回的列按原文件中的顺序排列
+    df = to_numeric_columns(df)
+    by_pos = dict(zip(sorted(indices), range(df.shape[1])))
+    return [df.iloc[:, by_pos[i]].to_numpy() for i in indices]
+
+
+# =============== 内置格式 ===============
+def sniff_excel(head, path):
+    """xls 按 OLE 文件头判断；xlsx 与普通 zip 压缩包的文件头相同，再看扩展名或包内的 xl/ 目录"""
+    if head.startswith(OLE_MAGIC):
+        return True
+    if head.startswith(ZIP_MAGIC):
+        return os.path.splitext(path)[1].lower() in EXCEL_EXTS or b'xl/' in head
+    return False
+
+
+def excel_engine():
+    """安装了 python-calamine 时使用 calamine 引擎（Rust 实现，比 openpyxl 快一个数量级），否则由 pandas 选择"""
+    try:
+        import python_calamine  # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return None
+
+
+def read_excel_file(path, head, progress_cb=None, prefetch=(), all_sheets=False, **options):
+    """
+    读取 Excel：默认只读第一个工作表；all_sheets 为 True 时一次打开工作簿读取全部工作表，每个工作表为一组数据
+
+    读取全部工作表时先只读表头，不包含所选列（prefetch）的工作表直接跳过，不解析其数据，
+    工作表名记录在返回值（Parts）的 skipped 中。
+    没有 calamine 时使用 openpyxl 的只读模式（pandas 默认如此）逐行读取。
+    """
+    datasets = []
+    skipped = []
+    with InputFile(path) as inp, pd.ExcelFile(inp.fh, engine=excel_engine()) as book:
+        sheets = book.sheet_names if all_sheets else book.sheet_names[:1]
+        for k, sheet in enumerate(sheets):
+            if all_sheets and prefetch:
+                header = book.parse(sheet, header=0, nrows=0)
+                names = {fix_garbled(clean_col_name(c)) for c in header.columns}
+                if not all(col in names for col in prefetch):
+                    skipped.append(sheet)
+                    continue
+            df = book.parse(sheet, header=0)  # 默认第一行作为列名
+            # Excel 不涉及分隔符
+            datasets.append({'df': df, 'source': {'format': 'excel', 'sheet': sheet},
+                             'encoding': "Excel", 'sep': None,
+                             'part': sheet if all_sheets else None})
+            if progress_cb is not None:
+                progress_cb(k + 1, len(sheets))
+    return Parts(datasets, skipped) if all_sheets else datasets[0]
+
+
+def sniff_qd(head, path):
+    """第一个非空行是 [Header] 时为 Quantum Design 的 .dat 文件"""
+    return head.lstrip(b'\xef\xbb\xbf \t\r\n')[:len(QD_HEADER_MARK)].lower() == QD_HEADER_MARK.encode()
+
+
+def read_qd_file(path, head, progress_cb=None, prefetch=(), **options):
+    """
+    跳过 [Header] 段，用 C 引擎按块解析 [Data] 段的所有列
+
+    未使用的选件通道整列为空：逐块记录各列是否出现过数据，至今为空的列不分配数组，
+    读完后仍为空的列直接丢弃（见 ColumnBuffers）；只在文件中间某段有数据的列照常保留。
+    """
+    encoding, _ = decode_head(head)
+    source = dict(parse_qd_header(path, encoding), format='qd', encoding=encoding)
+    names = dict(zip(source['usecols'], source.pop('names')))
+    df = read_csv_chunked(path, ',', encoding,
+                          progress_cb=progress_cb, drop_empty=True,
+                          skiprows=source['data_row'], header=None,
+                          usecols=source['usecols'], index_col=False,
+                          dtype={k: object for k in source['text_cols']},
+                          encoding_errors='replace')
+    if not df.shape[1]:
+        # 有数据行但所有列都为空：保留全部列
+        df = pd.DataFrame({k: np.full(len(df), np.nan) for k in source['usecols']})
+    # 结果的列标签是原始列位置
+    kept = [int(k) for k in df.columns]
+    df.columns = [names[k] for k in kept]
+    if kept != source['usecols']:
+        source['usecols'] = kept
+        source['text_cols'] = [k for k in source['text_cols'] if k in kept]
+        source['axes'] = _qd_axes(list(df.columns))
+    return {'df': df, 'source': source, 'encoding': encoding, 'sep': ','}
+
+
+def sniff_vsm(head, path):
+    """文件头前 10 行中出现 "vsm"（QD 的 MPMS3 文件头中也会出现，由 QD 格式先认领）"""
+    return any(b'vsm' in ln.lower() for ln in head.split(b'\n')[:10] if ln.strip())
+
+
+def read_vsm_file(path, head, progress_cb=None, prefetch=(), **options):
+    """按文件头找到的数据块位置和列名读取；识别失败时使用固定读取方式"""
+    encoding, text = decode_head(head)
+    layout = parse_vsm_header(text) or {'sep': ',', 'data_row': VSM_SKIPROWS, 'names': VSM_DEFAULT_NAMES,
+                                        'usecols': VSM_COLUMNS, 'axes': VSM_DEFAULT_NAMES, 'header': {}}
+    source = dict(layout, format='vsm', encoding=encoding)
+    names = source.pop('names')
+    # 数据块全是数值列：这次只解析默认列和即将绘制的列（与原来只读 Bz、emu 两列一样快），
+    # 其余列（温度、时间、角度等）在首次被选中时再解析
+    wanted = sorted({names.index(c) for c in list(source['axes'] or []) + list(prefetch) if c in names})
+    usecols = source['usecols']
+    columns = numeric = None
+    if wanted and not usecols and len(wanted) < len(names):
+        usecols = wanted
+        columns, numeric = names, [True] * len(names)
+    df = read_csv_chunked(path, source['sep'], encoding,
+                          progress_cb=progress_cb, chunksize=VSM_CHUNK_ROWS,
+                          skiprows=source['data_row'], header=None,
+                          usecols=usecols, index_col=False,
+                          encoding_errors='replace')
+    df.columns = [names[i] for i in wanted] if columns else names
+    return {'df': df, 'source': source, 'encoding': "VSM", 'sep': source['sep'],
+            'columns': columns, 'numeric': numeric}
+
+
+def sniff_text(head, path):
+    """通用文本格式：兜底，认领其他格式都不认领的文件"""
+    return True
+
+
+def read_text_file(path, head, progress_cb=None, prefetch=(), **options):
+    """分隔符文本按块流式读取，分隔符判断失败时按固定宽度解析"""
+    info = sniff_file(path, head)
+    enc_used = info['encoding']
+    chosen_sep = info['sep']
+    source = {'format': 'csv', 'sep': chosen_sep, 'encoding': enc_used, 'header_row': info['header_row']}
+    # 整个文件只流式读取一次；文件头之后出现的个别坏字节用替换字符处理，不再换编码重读
+    if chosen_sep:
+        df = read_csv_chunked(path, chosen_sep, enc_used,
+                              progress_cb=progress_cb,
+                              skiprows=info['header_row'],
+                              encoding_errors='replace')
+    else:
+        chosen_sep = 'fwf'
+        source.update(format='fwf', sep=chosen_sep)
+        layout = infer_fwf_layout(head, enc_used, info['header_row'])
+        if layout is None:
+            # 只有表头没有数据行
+            with InputFile(path) as inp:
+                df = pd.read_fwf(inp.fh, encoding=enc_used,
+                                 skiprows=info['header_row'],
+                                 encoding_errors='replace')
+        else:
+            source['cuts'] = layout['cuts']
+            df = read_fwf_chunked(path, enc_used, info['header_row'], layout['cuts'],
+                                  progress_cb=progress_cb)
+            df.columns = layout['names']
+    return {'df': df, 'source': source, 'encoding': enc_used, 'sep': chosen_sep}
+
+
+# 后注册的先判断：通用文本格式最先注册，作为兜底
+register_reader('text', sniff_text, read_text_file)
+register_reader('vsm', sniff_vsm, read_vsm_file)
+register_reader('qd', sniff_qd, read_qd_file)
+register_reader('excel', sniff_excel, read_excel_file)
+
+
+# =============== 文件目录信息 ===============
+def _estimate_rows(head, data_row, total, complete):
+    """
+    根据文件头中的数据行估计数据行数：complete 为 True（文件头就是整个文件）时直接计数，
+    否则用样本行的平均长度估计；文件头中没有数据行时返回 None
+    """
+    lines = head.split(b'\n')
+    if data_row >= len(lines):
+        return None
+    sample = lines[data_row:] if complete else lines[data_row:-1]
+    n = sum(1 for ln in sample if ln.strip())
+    if complete or not n:
+        return n if complete else None
+    start = sum(len(ln) + 1 for ln in lines[:data_row])
+    return int((total - start) * n / sum(len(ln) + 1 for ln in sample))
+
+
+def _describe_text(path, head, encoding, text):
+    info = sniff_file(path, head)
+    line = text.splitlines()[info['header_row']]
+    if info['sep'] is None:
+        layout = infer_fwf_layout(head, info['encoding'], info['header_row'])
+        names = layout['names'] if layout else re.split(r'\s{2,}|\t', line.strip())
+        return 'fwf', names, info['header_row'] + 1
+    if info['sep'] == r'\s+':
+        names = line.split()
+    else:
+        names = next(csv.reader([line], delimiter=info['sep']))
+    # 空列名与 pandas 读取时一致
+    return 'csv', [n.strip() or f"Unnamed: {k}" for k, n in enumerate(names)], info['header_row'] + 1
+
+
+def _describe_vsm(path, head, encoding, text):
+    layout = parse_vsm_header(text)
+    if layout is None:
+        return 'vsm', VSM_DEFAULT_NAMES, VSM_SKIPROWS
+    return 'vsm', layout['names'], layout['data_row']
+
+
+def _describe_qd(path, head, encoding, text):
+    layout = parse_qd_header(path, encoding)
+    return 'qd', layout['names'], layout['data_row']
+
+
+# 内置格式只看文件头就能得到列名和数据起始行：格式名 -> f(path, head, 编码, 文本) -> (格式, 列名, 数据起始行)
+_DESCRIBERS = {'text': _describe_text, 'vsm': _describe_vsm, 'qd': _describe_qd}
+
+
+def describe_file(path):
+    """
+    只读取文件头生成文件的目录信息（用于文件夹导入，不解析数据）
+
+    返回 {'path', 'size', 'format', 'columns', 'rows'}：rows 是按文件头中数据行的平均长度估计的行数。
+    Excel 只给出第一个工作表的列名；压缩文件不知道解压后的大小，只有整个文件都在文件头中时才给出行数；
+    zip 压缩包和第三方格式只给出格式，其余为 None。
+    """
+    info = {'path': path, 'size': os.path.getsize(path), 'format': None, 'columns': None, 'rows': None}
+    if archive_members(path) is not None:
+        info['format'] = 'zip'
+        return info
+    with InputFile(path) as inp:
+        head = inp.fh.read(HEAD_BYTES)
+        complete = len(head) < HEAD_BYTES
+        if inp.compression and not complete:
+            total = None
+        else:
+            total = inp.total
+    name, _ = find_reader(head, path)
+    info['format'] = name
+    if name == 'excel':
+        with InputFile(path) as inp, pd.ExcelFile(inp.fh, engine=excel_engine()) as book:
+            header = book.parse(book.sheet_names[0], header=0, nrows=0)
+        info['columns'] = [fix_garbled(clean_col_name(c)) for c in header.columns]
+        return info
+    describe = _DESCRIBERS.get(name)
+    if describe is None:
+        return info
+    encoding, text = decode_head(head)
+    fmt, names, data_row = describe(path, head, encoding, text)
+    info['format'] = fmt
+    info['columns'] = _unique_names([fix_garbled(clean_col_name(n)) for n in names])
+    if total is not None:
+        info['rows'] = _estimate_rows(head, data_row, total, complete)
+    return info
+
+
+class ColumnLoader:
+    """
+    列存储的按需读取：优先从磁盘缓存读取（内存映射），缓存中没有时重新解析，并补写入仍存在的缓存项
+
+    many() 一次读取多列，重新解析时只需扫描文件一遍（保存会话、导出时使用）。
+    """
+
+    def __init__(self, path, source, numeric, cache=None, entry=None):
+        self.path = path
+        self.source = source
+        self.numeric = numeric
+        self.cache = cache
+        self.entry = entry
+
+    def _from_cache(self, i):
+        if self.entry is None:
+            return None
+        try:
+            return self.cache.load_column(self.entry, i, 'num' if self.numeric[i] else 'str')
+        except OSError:
+            return None
+
+    def _reparse(self, indices):
+        """重新解析这些列；有缓存项时补写入缓存，之后不必再解析"""
+        arrays = dict(zip(indices, read_columns(self.path, self.source, indices)))
+        if self.entry is not None:
+            self.cache.put_columns(self.entry, arrays)
+        return arrays
+
+    def __call__(self, i):
+        arr = self._from_cache(i)
+        return self._reparse([i])[i] if arr is None else arr
+
+    def many(self, indices):
+        out = {i: self._from_cache(i) for i in indices}
+        missing = [i for i, arr in out.items() if arr is None]
+        if missing:
+            out.update(self._reparse(missing))
+        return out
+
+
+def _store_from_cache(file_path, cache, entry, meta, dtype, prefetch):
+    numeric = [kind == 'num' for kind in meta['kinds']]
+    loader = ColumnLoader(file_path, meta['source'], numeric, cache, entry)
+    store = ColumnStore(meta['columns'], numeric, meta['n_rows'], loader, dtype, meta['source'])
+    for col in prefetch:
+        if store.is_numeric(col):
+            store.get(col)
+    return store, meta['encoding'], meta['sep']
+
+
+def _datasets(parsed, name, **extra):
+    """把读取器的返回值整理为数据组字典的列表，source 中补上格式名和 extra 中的项"""
+    out = []
+    for item in parsed if isinstance(parsed, list) else [parsed]:
+        item = {'df': item} if isinstance(item, pd.DataFrame) else dict(item)
+        source = dict(item.get('source') or {})
+        source.setdefault('format', name)
+        source.update(extra)
+        item['source'] = source
+        out.append(item)
+    return out
+
+
+def read_archive(path, members, progress_cb=None, prefetch=(), **options):
+    """
+    并行读取 zip 压缩包中的数据文件，返回数据组字典的列表（Parts），每个成员一组（组名为成员名）
+
+    每个成员各自判断格式，直接从压缩包中边解压边解析，不写临时文件；无法读取的成员跳过。
+    各成员在工作线程中解析，progress_cb(已完成成员数, 成员总数) 只在调用线程中调用。
+    """
+    def read_member(member):
+        mpath = member_path(path, member)
+        head = read_head(mpath)
+        name, read = find_reader(head, mpath)
+        parsed = read(mpath, head, None, prefetch, **options)
+        datasets = _datasets(parsed, name, member=member, compression='zip')
+        for item in datasets:
+            item['part'] = f"{member}:{item['part']}" if item.get('part') is not None else member
+        return datasets, [f"{member}:{part}" for part in getattr(parsed, 'skipped', ())]
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(ARCHIVE_WORKERS, len(members), os.cpu_count() or 1)))
+    futures = [pool.submit(read_member, member) for member in members]
+    try:
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.1)
+            if progress_cb is not None:
+                progress_cb(len(futures) - len(pending), len(futures))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    datasets = Parts()
+    errors = []
+    for member, fut in zip(members, futures):
+        try:
+            member_datasets, skipped = fut.result()
+            datasets.extend(member_datasets)
+            datasets.skipped.extend(skipped)
+        except Exception as e:
+            print(f"跳过压缩包成员 {member}:", e)
+            errors.append(e)
+    if errors and len(errors) == len(members):
+        raise ValueError(f"压缩包中没有可读取的数据文件（{errors[0]}）")
+    return datasets
+
+
+def _build_store(file_path, parsed, cache, variant, dtype, prefetch):
+    """把一组数据（_datasets 整理后的字典）转换为列存储并写入缓存，返回 (列存储, 编码说明, 分隔符)"""
+    df = parsed['df']
+    source = parsed['source']
+    if parsed.get('part') is not None:
+        source['part'] = parsed['part']
+    enc_used = parsed.get('encoding')
+    chosen_sep = parsed.get('sep')
+    # 只解析了部分列时，文件的全部列名和数值标记
+    columns = parsed.get('columns')
+    partial = columns is not None
+    numeric = list(parsed['numeric']) if parsed.get('numeric') is not None else None
+
+    df.columns = [fix_garbled(clean_col_name(c)) for c in df.columns]
+    # 数值转换只在这里做一次，之后绘图、拾取和处理都直接使用浮点数组
+    df = to_numeric_columns(df)
+    if columns is None:
+        columns = list(df.columns)
+        numeric = [dt.kind in 'biuf' for dt in df.dtypes]
+    else:
+        # 已解析的列以转换结果为准
+        for col, dt in zip(df.columns, df.dtypes):
+            numeric[columns.index(col)] = dt.kind in 'biuf'
+    hit = (cache.put(file_path, df, enc_used, chosen_sep, source, columns, numeric, variant)
+           if cache is not None else None)
+
+    loader = ColumnLoader(file_path, source, numeric, cache, hit[0] if hit else None)
+    store = ColumnStore(columns, numeric, len(df), loader, dtype, source)
+    if hit is None:
+        # 没有缓存时其余列只能重新解析原文件：本次解析出的列全部保留，之后选中别的列也不必再读一遍
+        for pos, col in enumerate(df.columns):
+            store.put(columns.index(col) if partial else pos, df.iloc[:, pos].to_numpy())
+        return store, enc_used, chosen_sep
+    # 即将绘制的列直接从本次解析结果中保留，其余列随 df 一起释放，用到时从缓存读取
+    positions = {col: i for i, col in enumerate(df.columns)}
+    for col in prefetch:
+        if store.is_numeric(col) and col in positions:
+            store.put(store.index(col), df.iloc[:, positions[col]].to_numpy())
+    return store, enc_used, chosen_sep
+
+
+# 同一文件（路径、大小、修改时间都不变）只计算一次内容哈希
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def _file_stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def content_hash(path):
+    """
+    文件内容的哈希（十六进制字符串），分块流式读取，不把整个文件读入内存
+
+    安装了 xxhash 时使用 xxh3_128（接近磁盘读取速度），否则使用 hashlib 的 blake2b；结果带有算法前缀，两者不会混用。
+    """
+    memo_key = (os.path.abspath(path),) + _file_stat(path)
+    with _digests_lock:
+        digest = _digests.get(memo_key)
+    if digest is not None:
+        return digest
+    try:
+        import xxhash
+        h, prefix = xxhash.xxh3_128(), 'xxh3'
+    except ImportError:
+        h, prefix = hashlib.blake2b(digest_size=16), 'b2'
+    with open(path, 'rb') as fh:
+        while True:
+            block = fh.read(HASH_CHUNK_BYTES)
+            if not block:
+                break
+            h.update(block)
+    digest = f"{prefix}-{h.hexdigest()}"
+    with _digests_lock:
+        _digests[memo_key] = digest
+    return digest
+
+
+class SharedStores:
+    """
+    按文件内容共享列存储：内容相同的文件（重复拖入的同一文件，或不同目录中的副本）只解析一次，
+    得到同一组 ColumnStore，由各自的 LoadedFile 以不同的名称显示、各自记录处理流程
+
+    先按 (文件大小, 文件头的哈希) 粗略比较，只有与已读取（或正在读取）的文件相同时才计算整个文件的内容哈希，
+    没有重复的文件不需要多读一遍。
+    可以在多个工作线程中同时使用：同时读取内容相同的文件时，后来的等待先开始的读取完成；
+    先开始的读取失败或被取消时，后来的自行读取。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 每项：{'pre': 粗略键, 'path', 'stat': (大小, 修改时间), 'digest': 内容哈希（需要比较时才计算，之前没有这一项）,
+        #        'event': 读取完成, 'result': 读取结果}
+        self._entries = []
+
+    @staticmethod
+    def _digest_of(entry):
+        """已记录文件的内容哈希；文件在读取之后被修改时无法比较，返回 None"""
+        try:
+            if _file_stat(entry['path']) != entry['stat']:
+                return None
+            return content_hash(entry['path'])
+        except OSError:
+            return None
+
+    def get_or_load(self, path, variant, dtype, load):
+        """
+        内容相同的文件已读取（或正在读取）时返回同一组列存储，否则调用 load(sniffed) 读取
+
+        sniffed 是这里为粗略比较读取的 (文件头, 压缩格式)，传给 load_data_file，不必再读一次文件头。
+        """
+        stat = _file_stat(path)
+        sniffed = read_input_head(path)
+        pre = (stat[0], hashlib.blake2b(sniffed[0], digest_size=16).hexdigest(), variant, np.dtype(dtype).name)
+
+        digest = None
+        while True:
+            with self._lock:
+                same = [e for e in self._entries if e['pre'] == pre]
+                pending = [e for e in same if digest is not None and 'digest' not in e]
+                if not pending and (digest is not None or not same):
+                    entry = next((e for e in same if e.get('digest') == digest), None) if same else None
+                    owner = entry is None
+                    if owner:
+                        entry = {'pre': pre, 'path': path, 'stat': stat,
+                                 'event': threading.Event(), 'result': None}
+                        if digest is not None:
+                            entry['digest'] = digest
+                        self._entries.append(entry)
+                    break
+            # 有大小和文件头都相同的文件：计算内容哈希后再比较
+            if digest is None:
+                digest = content_hash(path)
+            for e in pending:
+                e['digest'] = self._digest_of(e)
+        if not owner:
+            entry['event'].wait()
+            return Parts(entry['result'], entry['result'].skipped) if entry['result'] is not None else load(sniffed)
+        try:
+            entry['result'] = load(sniffed)
+        except BaseException:
+            with self._lock:
+                self._entries = [e for e in self._entries if e is not entry]
+            raise
+        finally:
+            entry['event'].set()
+        return Parts(entry['result'], entry['result'].skipped)
+
+    def retain(self, stores):
+        """
+        只保留仍在使用的列存储（stores 之外的共享记录删除，内存随之释放）
+
+        移出或清空文件时调用；不再有共享记录的文件，其内容哈希的缓存也一并删除。
+        """
+        alive = {id(store) for store in stores}
+        with self._lock:
+            self._entries = [e for e in self._entries
+                             if not e['event'].is_set()
+                             or any(id(store) in alive for store, _, _ in e['result'] or ())]
+            paths = {os.path.abspath(e['path']) for e in self._entries}
+        with _digests_lock:
+            for key in [k for k in _digests if k[0] not in paths]:
+                del _digests[key]
+
+
+def load_data_file(file_path, progress_cb=None, cache=None, dtype=np.float64, prefetch=(), options=None,
+                   shared=None, sniffed=None):
+    """
+    解析单个数据文件，返回 [(列存储, 编码说明, 分隔符)]（Parts，skipped 为跳过的工作表等）
+
+    大多数文件只有一组数据；导入 Excel 的全部工作表时每个工作表为一组（没有包含所选列的工作表时可能为空），
+    zip 压缩包中每个数据文件为一组。gzip、xz、bz2 压缩的文件边读边解压，与未压缩的文件读法相同。
+    不涉及任何界面操作，可以在工作线程中调用；progress_cb 抛出的异常（如 LoadCancelled）会直接向上传递。
+    文件格式由注册表（见 readers.py）根据文件头选择，内置 Excel、QD、VSM 和通用文本格式；
+    options 是传给读取器的读取选项（如 {'all_sheets': True}）。
+    传入 cache（data_cache.ParsedDataCache）时优先读取缓存，未命中则解析后写入缓存。
+    返回的 ColumnStore 只在内存中保留 prefetch 列出的列（通常是当前选择的 X/Y 列），
+    其余列在首次被选中时才从缓存读取；没有缓存时保留本次解析出的所有列，不会为同一列再解析一遍文件。
+    dtype 为数值列的存储精度。
+    传入 shared（SharedStores）时，与已读取的文件内容相同则直接返回同一组列存储，不再解析。
+    sniffed 是已经读取的 (文件头, 压缩格式)（见 read_input_head），传入时不再重复读取文件头。
+    """
+    options = dict(options or {})
+    # 有读取选项时读取结果可能取决于所选的列（如跳过不含这些列的工作表），一并作为缓存键的一部分
+    variant = json.dumps(dict(options, prefetch=list(prefetch)), sort_keys=True) if options else ''
+    if shared is not None:
+        return shared.get_or_load(file_path, variant, dtype,
+                                  lambda head: load_data_file(file_path, progress_cb, cache, dtype, prefetch,
+                                                              options, sniffed=head))
+    if cache is not None:
+        hit = cache.lookup(file_path, variant)
+        if hit is not None:
+            entry, meta = hit
+            if 'parts' not in meta:
+                return Parts([_store_from_cache(file_path, cache, entry, meta, dtype, prefetch)])
+            parts = [cache.lookup(file_path, f"{variant}|{k}") for k in range(meta['parts'])]
+            if all(parts):
+                return Parts((_store_from_cache(file_path, cache, entry, part_meta, dtype, prefetch)
+                              for entry, part_meta in parts), meta.get('skipped', ()))
+
+    # 只读一次文件头（压缩文件为解压后的内容），由各格式的判断函数选出读取器
+    head, compression = sniffed if sniffed is not None else read_input_head(file_path)
+    members = archive_members(file_path) if head.startswith(ZIP_MAGIC) else None
+    if members is not None:
+        parsed = read_archive(file_path, members, progress_cb, prefetch, **options)
+    else:
+        name, read = find_reader(head, file_path)
+        parsed = read(file_path, head, progress_cb, prefetch, **options)
+        extra = {'compression': compression} if compression else {}
+        if not isinstance(parsed, list):
+            return Parts([_build_store(file_path, _datasets(parsed, name, **extra)[0], cache, variant, dtype,
+                                       prefetch)])
+        parsed = Parts(_datasets(parsed, name, **extra), getattr(parsed, 'skipped', ()))
+    results = Parts((_build_store(file_path, part, cache, f"{variant}|{k}", dtype, prefetch)
+                     for k, part in enumerate(parsed)), parsed.skipped)
+    if cache is not None:
+        cache.put_parts(file_path, variant, len(results), results.skipped)
+    return results
@@ -0,0 +1,379 @@
+# data_store.py
+"""已加载数据的存储：每个文件的列存储及其处理流程"""
+
+import os
+import mmap
+import shutil
+import numpy as np
+import pandas as pd
+from pipeline import Pipeline, MaskStep
+
+
+def is_mapped(arr):
+    """数组的数据是否来自内存映射文件（由系统按页读入，可随时从内存中丢弃）"""
+    while arr is not None:
+        if isinstance(arr, (np.memmap, mmap.mmap)):
+            return True
+        arr = getattr(arr, 'base', None)
+    return False
+
+
+class TakeLoader:
+    """
+    压缩后的列存储的读取函数：从压缩前的列存储重新读取某一列，只取保留的行
+
+    baked 是压缩时合并进原始数据的处理结果 {列位置: 已筛选的数组}，无法从原文件重新得到，一直保留在这里。
+    """
+
+    def __init__(self, base, rows, baked):
+        self.base = base
+        self.rows = rows
+        self.baked = baked
+
+    def __call__(self, i):
+        arr = self.baked.get(i)
+        return self.base._load(i)[self.rows] if arr is None else arr
+
+    def many(self, indices):
+        out = {i: self.baked[i] for i in indices if i in self.baked}
+        missing = [i for i in indices if i not in out]
+        many = getattr(self.base._loader, 'many', None)
+        if missing and many is not None:
+            out.update((i, arr[self.rows]) for i, arr in self.base._load_many(many, missing))
+        else:
+            out.update((i, self.base._load(i)[self.rows]) for i in missing)
+        return out
+
+
+class ColumnStore:
+    """
+    一个文件的列存储：每列是一个连续的 NumPy 数组，首次用到时才读入内存
+
+    loader(i) 负责取得第 i 列的数据（数值列为 float64，其余为 object 数组），
+    通常是从磁盘缓存中以内存映射方式读取，或在没有缓存时只重新解析这一列。
+    数值列可以选择以 float32 保存，内存占用减半。
+    source 记录原文件的读取方式（见 data_loader.load_data_file），跟随模式据此解析新追加的行。
+    """
+
+    def __init__(self, columns, numeric, n_rows, loader, dtype=np.float64, source=None):
+        self.columns = list(columns)
+        self.numeric = list(numeric)  # 与 columns 对齐，是否为数值列
+        self.n_rows = int(n_rows)
+        self.dtype = np.dtype(dtype)
+        self.source = source
+        self._loader = loader
+        self._arrays = {}  # 列位置 -> 已读入内存的数组
+        self._buffers = {}  # 列位置 -> 预留了增长空间的数组（跟随模式追加行时使用）
+        self._spill_folder = None  # 换出时写入的目录
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def header(self):
+        """文件头中的元数据 {键: 值}（VSM 等仪器文件）"""
+        return (self.source or {}).get('header') or {}
+
+    @property
+    def default_axes(self):
+        """该格式默认绘制的 [X 列, Y 列]（如 VSM 的磁场和磁矩），没有时为 None"""
+        return (self.source or {}).get('axes')
+
+    def index(self, col):
+        """列名对应的列位置（列名重复时取第一个）"""
+        return self.columns.index(col)
+
+    def is_numeric(self, col):
+        try:
+            return self.numeric[self.index(col)]
+        except ValueError:
+            return False
+
+    def _load(self, i):
+        return self._checked(i, self._loader(i))
+
+    def _checked(self, i, arr):
+        if len(arr) != self.n_rows:
+            raise ValueError(f"列 {self.columns[i]} 的行数与读取时不一致（文件可能已被修改）")
+        if self.numeric[i]:
+            arr = np.ascontiguousarray(arr, dtype=self.dtype)
+        return arr
+
+    def put(self, i, arr):
+        """直接放入已经解析好的列（读取文件时顺带保留即将绘制的列，避免再次读取）"""
+        if self.numeric[i]:
+            arr = np.ascontiguousarray(arr, dtype=self.dtype)
+        arr.flags.writeable = False
+        self._arrays[i] = arr
+
+    def get(self, col):
+        """某一列的数组（只读）；第一次访问时读入内存"""
+        i = self.index(col)
+        arr = self._arrays.get(i)
+        if arr is None:
+            arr = self._load(i)
+            # 数组在处理流程的各步骤之间共享，设为只读以防被就地修改
+            arr.flags.writeable = False
+            self._arrays[i] = arr
+        return arr
+
+    @property
+    def nbytes(self):
+        """已读入内存的列占用的字节数"""
+        return sum(arr.nbytes for arr in self._arrays.values())
+
+    @property
+    def resident_bytes(self):
+        """常驻内存的列占用的字节数（不含内存映射的列）"""
+        return sum(arr.nbytes for arr in self._arrays.values() if not is_mapped(arr))
+
+    @property
+    def mapped_bytes(self):
+        return self.nbytes - self.resident_bytes
+
+    def spill(self, folder):
+        """
+        把常驻内存的数值列写入 folder 并改为内存映射，返回释放的字节数
+
+        之后访问这些列时由系统按页读回，调用方无需感知；非数值列直接释放，用到时由 loader 重新读取。
+        跟随模式追加过行的数据仍在增长，不换出。
+        """
+        if self._buffers:
+            return 0
+        self._spill_folder = folder
+        freed = 0
+        for i, arr in list(self._arrays.items()):
+            if is_mapped(arr):
+                continue
+            if self.numeric[i]:
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, f"c{i}.npy")
+                np.save(path, arr)
+                self._arrays[i] = np.load(path, mmap_mode='r')
+            else:
+                del self._arrays[i]
+            freed += arr.nbytes
+        return freed
+
+    def take(self, rows, replace=None):
+        """
+        只包含 rows 行的新列存储（压缩数据时使用），本列存储不变，与之共用它的其他文件不受影响
+
+        replace 为 {列位置: 数组}（长度与 rows 相同），替换对应的原始列；已读入内存的列直接按行筛选，
+        其余列用到时再从本列存储读取并筛选。
+        """
+        replace = dict(replace or {})
+        if self._buffers:
+            # 跟随模式追加过的行只在内存中，无法从原文件重新读取：所有列都筛选后一直保留
+            self.load_all()
+            replace = {**{i: arr[rows] for i, arr in self._arrays.items()}, **replace}
+        # 读取函数引用的是不含已读入列的副本，本列存储的数组不会因此一直留在内存中
+        base = ColumnStore(self.columns, self.numeric, self.n_rows, self._loader, self.dtype, self.source)
+        store = ColumnStore(self.columns, self.numeric, len(rows), TakeLoader(base, rows, replace),
+                            self.dtype, self.source)
+        for i, arr in replace.items():
+            store.put(i, arr)
+        for i, arr in self._arrays.items():
+            if i not in replace:
+                store.put(i, arr[rows])
+        return store
+
+    def copy(self):
+        """
+        共用已读入的列（只读数组）的新列存储
+
+        跟随模式追加行之前调用，内容相同而共用同一列存储的其他文件不受影响。
+        """
+        store = ColumnStore(self.columns, self.numeric, self.n_rows, self._loader, self.dtype, self.source)
+        store._arrays = dict(self._arrays)
+        return store
+
+    def evict(self):
+        """
+        释放已读入内存的列，返回释放的字节数；之后用到时再由 loader 读取
+
+        换出到磁盘的列一并释放，换出目录随之删除（再次换出时重新创建）。
+        跟随模式追加过行的数据只存在于内存中，不能释放。
+        """
+        if self._buffers:
+            return 0
+        freed = self.nbytes
+        self._arrays.clear()
+        if self._spill_folder is not None:
+            shutil.rmtree(self._spill_folder, ignore_errors=True)
+            self._spill_folder = None
+        return freed
+
+    def iter_columns(self, batch_bytes=256 * 1024 * 1024):
+        """
+        依次给出 (列位置, 数组)，用于导出和保存会话；未读入内存的列只临时读取
+
+        读取函数支持 many() 时按批一次读取多列（每批约 batch_bytes），重新解析时不必每列扫描一遍文件。
+        """
+        many = getattr(self._loader, 'many', None)
+        batch = max(1, batch_bytes // max(self.n_rows * 8, 1))
+        pending = []
+        for i in range(len(self.columns)):
+            if i in self._arrays:
+                yield i, self._arrays[i]
+                continue
+            if many is None:
+                yield i, self._load(i)
+                continue
+            pending.append(i)
+            if len(pending) >= batch or i == len(self.columns) - 1:
+                yield from self._load_many(many, pending)
+                pending = []
+        if pending:
+            yield from self._load_many(many, pending)
+
+    def _load_many(self, many, indices):
+        loaded = many(indices)
+        for i in indices:
+            yield i, self._checked(i, loaded.pop(i))
+
+    def load_all(self):
+        """把所有列读入内存（跟随模式追加行之前调用）"""
+        for i, arr in self.iter_columns():
+            if i not in self._arrays:
+                arr.flags.writeable = False
+                self._arrays[i] = arr
+
+    def append(self, new, overlap=0):
+        """
+        在末尾追加行：new 为 {列位置: 数组}，必须包含所有列；overlap 行新数据覆盖原有的最后几行
+
+        每列预留 50% 的增长空间，多次追加时摊还为 O(新增行数)，已有数据不会每次都被复制。
+        """
+        self.load_all()
+        start = self.n_rows - overlap
+        n = start + len(next(iter(new.values())))
+        for i, add in new.items():
+            buf = self._buffers.get(i)
+            if buf is None or len(buf) < n:
+                grown = np.empty(max(n + n // 2, 1024), dtype=self.dtype if self.numeric[i] else object)
+                grown[:start] = self._arrays[i][:start]
+                buf = self._buffers[i] = grown
+            buf[start:n] = add
+            view = buf[:n]
+            view.flags.writeable = False
+            self._arrays[i] = view
+        self.n_rows = n
+
+    def to_frame(self):
+        """组装成完整的 DataFrame（用于导出）"""
+        data = dict(self.iter_columns())
+        df = pd.DataFrame(data, copy=False)
+        df.columns = self.columns
+        return df
+
+
+class LoadedFile:
+    """
+    一个已加载的数据文件
+
+    store 是解析得到的原始数据（ColumnStore），任何处理都不会修改它；对称、归一化、去背底和删除点都作为
+    处理步骤记录在 pipeline 中，绘图、拾取和导出使用的是处理流程的输出。
+    """
+
+    def __init__(self, path, store, encoding=None, sep=None):
+        self.path = path
+        self.store = store
+        self.encoding = encoding  # 读取时使用的编码与分隔符（仅用于显示和保存会话）
+        self.sep = sep
+        self.pipeline = Pipeline(store)
+        # 读取时已转换为浮点数的列；其余为非数值列，不出现在列选择中
+        self.numeric_columns = [c for c, num in zip(store.columns, store.numeric) if num]
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def part(self):
+        """一个文件包含多组数据时这一组的名称（如工作表名），否则为 None"""
+        return (self.store.source or {}).get('part')
+
+    @property
+    def name(self):
+        """显示用的名称：文件名，多组数据时加上组名"""
+        name = os.path.basename(self.path)
+        return f"{name} [{self.part}]" if self.part else name
+
+    @property
+    def label(self):
+        """图例中的名称：不含扩展名的文件名，多组数据时加上组名"""
+        label = os.path.splitext(os.path.basename(self.path))[0]
+        return f"{label} [{self.part}]" if self.part else label
+
+    @property
+    def columns(self):
+        return self.store.columns
+
+    def evict(self):
+        """释放原始数据和处理结果占用的内存（处理步骤保留，再次用到时重新计算），返回释放的原始数据字节数"""
+        freed = self.store.evict()
+        self.pipeline.invalidate(0)
+        return freed
+
+    @property
+    def resident_bytes(self):
+        """原始数据和缓存的处理结果常驻内存的字节数"""
+        return self.store.resident_bytes + self.pipeline.nbytes
+
+    def spill(self, folder):
+        """把原始数据换出到 folder（内存映射），并丢弃缓存的处理结果，返回释放的字节数"""
+        freed = self.store.spill(folder) + self.pipeline.nbytes
+        self.pipeline.invalidate(0)
+        return freed
+
+    def has_numeric(self, *cols):
+        """这些列是否都是数值列"""
+        return all(col in self.numeric_columns for col in cols)
+
+    def column(self, col):
+        """处理后的某一列（只读浮点数组）"""
+        return self.pipeline.column(col)
+
+    @property
+    def keep(self):
+        """处理后的保留掩码，None 表示没有被删除的行"""
+        return self.pipeline.keep
+
+    def compact(self):
+        """
+        真正移除已删除的行，返回 (移除的行数, 合并进原始数据的处理步骤数)
+
+        最后一个删除点步骤及之前的所有步骤合并为新的原始数据（被处理过的列以处理结果保存），
+        之后的步骤原样保留；压缩后行位置重新编号。没有被删除的行时不做任何事。
+        """
+        steps = self.pipeline.steps
+        last = max((i for i, step in enumerate(steps) if isinstance(step, MaskStep)), default=None)
+        if last is None:
+            return 0, 0
+        cols, keep = self.pipeline.result(last + 1)
+        if keep is None or keep.all():
+            return 0, 0
+        rows = np.flatnonzero(keep)
+        baked = {self.store.index(col): np.ascontiguousarray(arr[rows], dtype=self.store.dtype)
+                 for col, arr in cols.items()}
+        self.store = self.store.take(rows, baked)
+        remaining = steps[last + 1:]
+        merged = sum(1 for step in steps[:last + 1] if not isinstance(step, MaskStep))
+        self.pipeline = Pipeline(self.store)
+        for step in remaining:
+            self.pipeline.add_step(step)
+        return len(keep) - len(rows), merged
+
+    def delete_rows(self, rows):
+        """按行位置删除（屏蔽）数据点，返回 (实际被删除的行位置, MaskStep, 是否新建了该步骤)"""
+        return self.pipeline.delete_rows(rows)
+
+    def output_df(self):
+        """处理后、去掉已删除行的数据（用于导出）"""
+        df = self.store.to_frame()
+        for col, arr in self.pipeline.processed_columns().items():
+            df[col] = arr
+        keep = self.keep
+        if keep is not None and not keep.all():
+            df = df[keep]
+        return df
@@ -0,0 +1,193 @@
+# edit_history.py
+"""撤回/重做历史：每一步只记录对处理流程的修改（增删步骤、修改参数、删除点），不保存数据副本"""
+
+import numpy as np
+from pipeline import MaskStep
+
+DEFAULT_HISTORY_MB = 512
+
+
+class AddStepsEdit:
+    """在若干文件的处理流程末尾各追加一个步骤（对称、归一化、去背底）"""
+    preserve_view = False
+    nbytes = 0  # 步骤本身不保存数据
+
+    def __init__(self, name, added):
+        self.name = name
+        self.added = list(added)  # [(文件下标, 步骤)]
+
+    def __bool__(self):
+        return bool(self.added)
+
+    def undo(self, files):
+        for fi, step in reversed(self.added):
+            pipeline = files[fi].pipeline
+            pipeline.remove_step(pipeline.index(step))
+
+    def redo(self, files):
+        for fi, step in self.added:
+            files[fi].pipeline.add_step(step)
+
+
+class DeleteEdit:
+    """删除数据点：只保存被删除的行位置，以及它们所在的 MaskStep"""
+    preserve_view = True
+
+    def __init__(self, name, deleted):
+        self.name = name
+        # [(文件下标, 行位置, MaskStep, 是否新建了该步骤)]
+        self.deleted = [(fi, np.asarray(rows, dtype=np.intp), step, created)
+                        for fi, (rows, step, created) in deleted]
+
+    def __bool__(self):
+        return any(len(rows) for _, rows, _, _ in self.deleted)
+
+    @property
+    def nbytes(self):
+        return sum(rows.nbytes for _, rows, _, _ in self.deleted)
+
+    def undo(self, files):
+        for fi, rows, step, created in reversed(self.deleted):
+            if not len(rows):
+                continue
+            pipeline = files[fi].pipeline
+            if created:
+                pipeline.remove_step(pipeline.index(step))
+            else:
+                pipeline.unmask_rows(step, rows)
+
+    def redo(self, files):
+        for fi, rows, step, created in self.deleted:
+            if not len(rows):
+                continue
+            pipeline = files[fi].pipeline
+            if created:
+                pipeline.add_step(step)
+            else:
+                pipeline.mask_rows(step, rows)
+
+
+class RemoveStepEdit:
+    """从某个文件的处理流程中移除一个步骤"""
+
+    def __init__(self, name, fi, index, step):
+        self.name = name
+        self.fi = fi
+        self.index = index
+        self.step = step
+
+    def __bool__(self):
+        return True
+
+    @property
+    def preserve_view(self):
+        # 移除或恢复删除点步骤时保留当前视图
+        return isinstance(self.step, MaskStep)
+
+    @property
+    def nbytes(self):
+        return getattr(self.step, 'nbytes', 0)
+
+    def undo(self, files):
+        files[self.fi].pipeline.insert_step(self.index, self.step)
+
+    def redo(self, files):
+        files[self.fi].pipeline.remove_step(self.index)
+
+
+class StepParamsEdit:
+    """修改某个步骤的参数（如去背底的拟合区间）：保存修改前后的参数"""
+    preserve_view = False
+    nbytes = 0
+
+    def __init__(self, name, fi, step, old, new):
+        self.name = name
+        self.fi = fi
+        self.step = step
+        self.old = dict(old)
+        self.new = dict(new)
+
+    def __bool__(self):
+        return self.old != self.new
+
+    def _set(self, files, params):
+        for key, value in params.items():
+            setattr(self.step, key, value)
+        files[self.fi].pipeline.step_changed(self.step)
+
+    def undo(self, files):
+        self._set(files, self.old)
+
+    def redo(self, files):
+        self._set(files, self.new)
+
+
+class EditHistory:
+    """
+    撤回/重做栈，按字节预算而不是步数限制历史长度
+
+    总占用超过预算时丢弃最早的撤回步骤；最近的一步总会保留，保证至少可以撤回一次。
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_HISTORY_MB * 1024 * 1024):
+        self.budget_bytes = int(budget_bytes)
+        self.undo_stack = []
+        self.redo_stack = []
+        self.changed_callback = None  # 撤回/重做栈变化后调用（界面据此启用或禁用撤回、重做按钮）
+
+    def _changed(self):
+        if self.changed_callback is not None:
+            self.changed_callback()
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.undo_stack) + sum(c.nbytes for c in self.redo_stack)
+
+    def push(self, cmd):
+        """记录一个已经执行过的操作；新操作会清空重做栈"""
+        if not cmd:
+            return
+        self.undo_stack.append(cmd)
+        self.redo_stack.clear()
+        self._enforce_budget()
+        self._changed()
+
+    def _enforce_budget(self):
+        total = self.nbytes
+        while total > self.budget_bytes and len(self.undo_stack) > 1:
+            total -= self.undo_stack.pop(0).nbytes
+
+    def set_budget(self, budget_bytes):
+        self.budget_bytes = int(budget_bytes)
+        self._enforce_budget()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self, files):
+        """撤回最近一步，返回该操作（没有可撤回的操作时返回 None）"""
+        if not self.undo_stack:
+            return None
+        cmd = self.undo_stack.pop()
+        cmd.undo(files)
+        self.redo_stack.append(cmd)
+        self._changed()
+        return cmd
+
+    def redo(self, files):
+        """重做最近撤回的一步，返回该操作（没有可重做的操作时返回 None）"""
+        if not self.redo_stack:
+            return None
+        cmd = self.redo_stack.pop()
+        cmd.redo(files)
+        self.undo_stack.append(cmd)
+        self._changed()
+        return cmd
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._changed()
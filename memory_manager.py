@@ -0,0 +1,95 @@
+# memory_manager.py
+"""
+已加载数据的内存预算：按最近一次绘制的先后记录各文件，常驻内存超出预算时，
+把最久未绘制的文件换出到磁盘上的临时目录（改为内存映射），绘图、处理或导出再用到时由系统按页读回
+"""
+
+import os
+import shutil
+import tempfile
+import weakref
+
+DEFAULT_MEMORY_MB = 2048
+
+
+class MemoryManager:
+    """
+    files 是 LoadedFile 列表（见 data_store），按对象身份跟踪，文件被移除后记录自动消失
+
+    换出后数据仍可直接访问（内存映射数组），不需要调用方显式读回；换出目录在程序退出时删除。
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_MEMORY_MB * 1024 * 1024):
+        self.budget_bytes = int(budget_bytes)
+        self._last_used = weakref.WeakKeyDictionary()  # LoadedFile -> 最近一次绘制的序号
+        self._spilled = weakref.WeakKeyDictionary()  # LoadedFile -> 换出次数
+        self._dirs = weakref.WeakKeyDictionary()  # ColumnStore -> 换出目录（同一列存储多次换出时复用）
+        self._clock = 0
+        self._root = None
+        self._next_dir = 0
+        self.spilled_bytes = 0  # 累计换出的字节数
+
+    def set_budget(self, budget_bytes):
+        self.budget_bytes = int(budget_bytes)
+
+    def touch(self, lf):
+        """记录文件刚被绘制"""
+        self._clock += 1
+        self._last_used[lf] = self._clock
+
+    def _spill_dir(self, store):
+        """列存储的换出目录：每个列存储一个，列存储被释放时删除（释放已读入的列时由 ColumnStore.evict 删除）"""
+        folder = self._dirs.get(store)
+        if folder is not None:
+            return folder
+        if self._root is None:
+            self._root = tempfile.mkdtemp(prefix='instplot-spill-')
+            # 换出的数组仍以内存映射打开，根目录在本对象释放（程序退出）时才删除
+            weakref.finalize(self, shutil.rmtree, self._root, True)
+        self._next_dir += 1
+        folder = self._dirs[store] = os.path.join(self._root, f"f{self._next_dir}")
+        weakref.finalize(store, shutil.rmtree, folder, True)
+        return folder
+
+    def resident_bytes(self, files):
+        """常驻内存的总字节数（内容相同的文件共用的列存储只计一次）"""
+        stores = {id(lf.store): lf.store for lf in files}
+        return (sum(store.resident_bytes for store in stores.values())
+                + sum(lf.pipeline.nbytes for lf in files))
+
+    def enforce(self, files, budget_bytes=None):
+        """
+        常驻内存超出预算时，按最久未绘制的顺序换出文件，直到回到预算以内，返回被换出的文件
+
+        budget_bytes 默认为设置的预算，传入 0 时换出全部文件。
+        """
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        total = self.resident_bytes(files)
+        if total <= budget:
+            return []
+        spilled = []
+        for lf in sorted(files, key=lambda lf: self._last_used.get(lf, 0)):
+            if total <= budget:
+                break
+            if not lf.resident_bytes:
+                continue
+            freed = lf.spill(self._spill_dir(lf.store))
+            if freed:
+                total -= freed
+                self.spilled_bytes += freed
+                self._spilled[lf] = self._spilled.get(lf, 0) + 1
+                spilled.append(lf)
+        return spilled
+
+    def report(self, files):
+        """
+        各文件的内存占用，按最近绘制的先后排列：
+        [{'file', 'resident', 'mapped', 'last_used', 'spills'}]，last_used 为 0 表示尚未绘制
+        """
+        rows = [{'file': lf,
+                 'resident': lf.resident_bytes,
+                 'mapped': lf.store.mapped_bytes,
+                 'last_used': self._last_used.get(lf, 0),
+                 'spills': self._spilled.get(lf, 0)} for lf in files]
+        rows.sort(key=lambda r: -r['last_used'])
+        return rows
@@ -0,0 +1,333 @@
+# pipeline.py
+"""
+数据处理流程：每个文件按顺序记录处理步骤（对称、归一化、去背底、删除点），
+原始数据始终保持不变，每一步的结果按需计算并缓存
+"""
+
+import numpy as np
+
+
+#纵坐标对称以及归一化数据
+def center_data(Y, ref=None):
+    """ref: 用于计算对称中心的数据（默认为 Y 本身）"""
+    Y = np.asarray(Y)
+    ref = Y if ref is None else np.asarray(ref)
+    center_value = (np.nanmax(ref) + np.nanmin(ref)) / 2
+    centered_Y = Y - center_value
+    return centered_Y
+
+def normalize_data(Y, top_n=20, ref=None):
+    """ref: 用于计算归一化系数的数据（默认为 Y 本身）"""
+    # 列在读取时已转换为浮点数，这里不再逐值转换
+    Y = np.asarray(Y, dtype=float)
+    ref = Y if ref is None else np.asarray(ref, dtype=float)
+
+    valid_Y = ref[~np.isnan(ref)]
+
+    if len(valid_Y) == 0:
+        return Y, np.nan
+    if len(valid_Y) < top_n:
+        top_n = len(valid_Y)
+
+    top_n_avg = np.nanmean(np.partition(valid_Y, -top_n)[-top_n:])
+    if top_n_avg == 0:
+        return Y, top_n_avg
+
+    normalized_Y = np.where(Y > top_n_avg,
+                            1,
+                            np.where(Y < -top_n_avg,
+                                     -1,
+                                     Y / top_n_avg
+                                    )
+                           )
+    return normalized_Y, top_n_avg
+
+
+# =============== 处理步骤 ===============
+# 每个步骤实现 apply(get, keep, n_rows)：
+#     get(col) 返回上一步输出的某一列（只读浮点数组），keep 为上一步的保留掩码（None 表示全部保留），
+#     返回 (本步修改过的列 {列名: 新数组}, 新的保留掩码)。步骤不得就地修改输入数组。
+
+class CenterStep:
+    """纵向对称：减去 (最大值 + 最小值) / 2，只根据未删除的点计算"""
+    kind = 'center'
+    name = "对称处理"
+
+    def __init__(self, col):
+        self.col = col
+
+    def params(self):
+        return {'col': self.col}
+
+    def describe(self):
+        return self.col
+
+    def apply(self, get, keep, n_rows):
+        Y = get(self.col)
+        return {self.col: center_data(Y, ref=Y if keep is None else Y[keep])}, keep
+
+
+class NormalizeStep:
+    """先对称再归一化，统计量只根据未删除的点计算"""
+    kind = 'normalize'
+    name = "归一化"
+
+    def __init__(self, col, top_n=20):
+        self.col = col
+        self.top_n = top_n
+        self.top_n_avg = None  # 最近一次计算得到的归一化系数
+
+    def params(self):
+        return {'col': self.col, 'top_n': self.top_n}
+
+    def describe(self):
+        return self.col
+
+    def apply(self, get, keep, n_rows):
+        Y = get(self.col)
+        Y = center_data(Y, ref=Y if keep is None else Y[keep])
+        Y, self.top_n_avg = normalize_data(Y, top_n=self.top_n, ref=Y if keep is None else Y[keep])
+        return {self.col: Y}, keep
+
+
+class BackgroundStep:
+    """去线性背景：在 [x_min, x_max] 区间内拟合直线并从整条曲线中减去"""
+    kind = 'background'
+    name = "去背底"
+
+    def __init__(self, x_col, col, x_min, x_max):
+        self.x_col = x_col
+        self.col = col
+        self.x_min = x_min
+        self.x_max = x_max
+
+    def params(self):
+        return {'x_col': self.x_col, 'col': self.col, 'x_min': self.x_min, 'x_max': self.x_max}
+
+    def describe(self):
+        return f"{self.col}，拟合区间 [{self.x_min:g}, {self.x_max:g}]"
+
+    def window_mask(self, X, Y, keep):
+        """拟合区间内可用于拟合的点（排除无效值和已删除的点）"""
+        mask = (X >= self.x_min) & (X <= self.x_max) & ~np.isnan(Y)
+        if keep is not None:
+            mask &= keep
+        return mask
+
+    def apply(self, get, keep, n_rows):
+        X = get(self.x_col)
+        Y = get(self.col)
+        mask = self.window_mask(X, Y, keep)
+        if not mask.any():
+            # 区间内没有数据点时不做处理
+            return {}, keep
+        p = np.polyfit(X[mask], Y[mask], 1)
+        return {self.col: Y - np.polyval(p, X)}, keep
+
+
+class MaskStep:
+    """
+    删除数据点：记录被删除的行位置（原始数据中的行号）
+
+    行位置按每次删除分块保存；位于流程末尾时，新的删除直接追加到本步骤，无需重算任何结果。
+    """
+    kind = 'mask'
+    name = "删除点"
+
+    def __init__(self):
+        self.chunks = []
+
+    def params(self):
+        # 行位置数据量可能很大，不放在参数中，由保存方单独存储
+        return {}
+
+    @property
+    def rows(self):
+        """全部被删除的行位置"""
+        if not self.chunks:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(self.chunks)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.chunks)
+
+    @property
+    def nbytes(self):
+        return sum(rows.nbytes for rows in self.chunks)
+
+    def describe(self):
+        return f"{len(self)} 个点"
+
+    def extend(self, rows):
+        self.chunks.append(rows)
+
+    def shrink(self, rows):
+        """撤销某一次追加（按对象身份查找对应的分块）"""
+        for i in range(len(self.chunks) - 1, -1, -1):
+            if self.chunks[i] is rows:
+                del self.chunks[i]
+                return
+
+    def apply(self, get, keep, n_rows):
+        keep = np.ones(n_rows, dtype=bool) if keep is None else keep.copy()
+        for rows in self.chunks:
+            keep[rows] = False
+        return {}, keep
+
+
+# 步骤类型名 -> 步骤类，用于从保存的参数重建步骤
+STEP_TYPES = {cls.kind: cls for cls in (CenterStep, NormalizeStep, BackgroundStep, MaskStep)}
+
+
+def make_step(kind, params):
+    return STEP_TYPES[kind](**params)
+
+
+class Pipeline:
+    """
+    一个文件的处理流程
+
+    _results[i] 缓存第 i 步之后的状态 (被修改过的列, 保留掩码)，被修改过的列以字典浅拷贝逐步传递，
+    未被修改的列直接引用列存储中的原始数组，不做复制。
+    修改或删除第 i 步时只让第 i 步及之后的缓存失效，下次取数据时再从最近的有效缓存开始重算。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.steps = []
+        self._results = []  # 与 steps 对齐，None 表示尚未计算
+
+    def raw_column(self, col):
+        """原始数据的某一列（只读数组，由列存储在首次使用时读入）"""
+        if not self.store.is_numeric(col):
+            raise ValueError(f"列 {col} 不是数值列")
+        return self.store.get(col)
+
+    def result(self, n):
+        """前 n 步之后的 (被修改过的列 {列名: 数组}, 保留掩码)；压缩数据时用来合并前 n 步"""
+        return self._result(n)
+
+    def _result(self, n):
+        """前 n 步之后的 (被修改过的列, 保留掩码)"""
+        if n == 0:
+            return {}, None
+        if self._results[n - 1] is None:
+            start = n - 1
+            while start > 0 and self._results[start - 1] is None:
+                start -= 1
+            cols, keep = self._result(start)
+            for i in range(start, n):
+                cols, keep = self._apply(self.steps[i], cols, keep)
+                self._results[i] = (cols, keep)
+        return self._results[n - 1]
+
+    def _apply(self, step, cols, keep):
+        def get(col):
+            arr = cols.get(col)
+            return self.raw_column(col) if arr is None else arr
+        try:
+            changed, keep = step.apply(get, keep, len(self.store))
+        except Exception as e:
+            # 处理失败的步骤不改变数据
+            print(f"[{step.name}] 处理失败: {e}")
+            return cols, keep
+        if changed:
+            cols = dict(cols)
+            cols.update(changed)
+        return cols, keep
+
+    def column(self, col):
+        """经过全部处理步骤后的某一列"""
+        cols, _ = self._result(len(self.steps))
+        arr = cols.get(col)
+        return self.raw_column(col) if arr is None else arr
+
+    def processed_columns(self):
+        """经过全部处理步骤后被修改过的列 {列名: 数组}"""
+        return self._result(len(self.steps))[0]
+
+    @property
+    def keep(self):
+        """经过全部处理步骤后的保留掩码（None 表示没有被删除的点）"""
+        return self._result(len(self.steps))[1]
+
+    @property
+    def nbytes(self):
+        """缓存的各步结果占用的字节数（多步之间共享的数组只计一次）"""
+        arrays = {}
+        for result in self._results:
+            if result is None:
+                continue
+            cols, keep = result
+            for arr in list(cols.values()) + [keep]:
+                if arr is not None:
+                    arrays[id(arr)] = arr.nbytes
+        return sum(arrays.values())
+
+    def invalidate(self, index):
+        """第 index 步及之后的缓存失效"""
+        for i in range(index, len(self._results)):
+            self._results[i] = None
+
+    def index(self, step):
+        for i, s in enumerate(self.steps):
+            if s is step:
+                return i
+        raise ValueError("步骤不在处理流程中")
+
+    def add_step(self, step):
+        self.steps.append(step)
+        self._results.append(None)
+
+    def insert_step(self, index, step):
+        self.steps.insert(index, step)
+        self._results.insert(index, None)
+        self.invalidate(index)
+
+    def remove_step(self, index):
+        step = self.steps.pop(index)
+        self._results.pop(index)
+        self.invalidate(index)
+        return step
+
+    def step_changed(self, step):
+        """步骤参数被修改后调用"""
+        self.invalidate(self.index(step))
+
+    # =============== 删除点 ===============
+    def delete_rows(self, rows):
+        """
+        删除（屏蔽）数据点，返回 (实际被删除的行位置, 所在的 MaskStep, 是否新建了该步骤)
+
+        流程末尾已经是 MaskStep 时直接追加，否则在末尾新建一个 MaskStep。
+        """
+        keep = self.keep
+        rows = np.unique(np.asarray(rows, dtype=np.intp))
+        if keep is not None:
+            rows = rows[keep[rows]]
+        tail = self.steps[-1] if self.steps else None
+        if not len(rows):
+            return rows, tail, False
+        if isinstance(tail, MaskStep):
+            self.mask_rows(tail, rows)
+            return rows, tail, False
+        step = MaskStep()
+        step.extend(rows)
+        self.add_step(step)
+        return rows, step, True
+
+    def mask_rows(self, step, rows):
+        step.extend(rows)
+        self._update_mask(step, rows, False)
+
+    def unmask_rows(self, step, rows):
+        step.shrink(rows)
+        self._update_mask(step, rows, True)
+
+    def _update_mask(self, step, rows, value):
+        i = self.index(step)
+        if i == len(self.steps) - 1 and self._results[i] is not None:
+            # 末尾步骤的保留掩码只属于它自己，直接就地修改
+            self._results[i][1][rows] = value
+        else:
+            self.invalidate(i)
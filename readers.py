@@ -0,0 +1,82 @@
+# readers.py
+"""
+文件格式注册表：每种格式注册一个判断函数 sniff(head, path) 和一个读取函数 read(path, head, progress_cb, prefetch, **options)
+
+读取文件时只读一次文件头（head，文件开头的一小段字节），依次交给各格式判断（后注册的优先），
+第一个认领的格式负责读取，不再为判断格式而多次读取文件。
+options 是读取选项（如 all_sheets），读取器应忽略不认识的选项。
+read 返回 DataFrame，或包含以下键的字典（一个文件包含多组数据时返回这样的字典列表）：
+    df       - 解析得到的 DataFrame（必需）
+    source   - 读取方式，缓存被淘汰后据此只重新解析某一列（默认为 {'format': 格式名}）
+    encoding - 编码说明（显示在状态栏）
+    sep      - 分隔符
+    columns / numeric - df 只包含部分列时，文件的全部列名和数值标记
+    part     - 多组数据时这一组的名称（如工作表名），显示在图例中
+
+第三方读取器可以通过 entry point 组 "instplot.readers" 注册：名称为格式名，指向的对象（模块或类）
+提供 sniff 和 read 两个属性。path 可能是压缩文件或 "压缩包::成员名"，读取器应使用
+compressed.InputFile(path).fh 打开，而不是直接 open(path)。例如在插件的 pyproject.toml 中：
+    [project.entry-points."instplot.readers"]
+    mylab = "mylab_reader"
+"""
+
+import threading
+
+ENTRY_POINT_GROUP = 'instplot.readers'
+
+_readers = []  # [(格式名, sniff, read)]，按判断顺序排列
+_plugins_loaded = False
+_lock = threading.Lock()
+
+
+def register_reader(name, sniff, read):
+    """注册读取器（同名的会被替换）；后注册的先判断，因此插件可以覆盖内置格式"""
+    with _lock:
+        _readers[:] = [r for r in _readers if r[0] != name]
+        _readers.insert(0, (name, sniff, read))
+
+
+def load_plugins():
+    """加载通过 entry point 注册的第三方读取器（只在第一次读取文件时加载一次）"""
+    global _plugins_loaded
+    with _lock:
+        if _plugins_loaded:
+            return
+        _plugins_loaded = True
+    try:
+        from importlib.metadata import entry_points
+        eps = entry_points(group=ENTRY_POINT_GROUP)
+    except Exception as e:
+        print("读取插件列表失败:", e)
+        return
+    for ep in eps:
+        try:
+            plugin = ep.load()
+            register_reader(ep.name, plugin.sniff, plugin.read)
+            print("已加载读取插件:", ep.name)
+        except Exception as e:
+            print(f"加载读取插件 {ep.name} 失败:", e)
+
+
+def find_reader(head, path):
+    """根据文件头选择读取器，返回 (格式名, read)；没有格式认领时抛出 ValueError"""
+    load_plugins()
+    with _lock:
+        readers = list(_readers)
+    for name, sniff, read in readers:
+        try:
+            if sniff(head, path):
+                return name, read
+        except Exception as e:
+            # 个别判断函数出错不影响其他格式
+            print(f"[{name}] 格式判断失败:", e)
+    raise ValueError("无法识别的文件格式")
+
+
+def get_reader(name):
+    """格式名对应的 read 函数，没有注册时返回 None"""
+    with _lock:
+        for reader_name, _, read in _readers:
+            if reader_name == name:
+                return read
+    return None
@@ -0,0 +1,127 @@
+# session.py
+"""
+会话保存与恢复：把当前加载的所有文件、处理流程和视图状态保存到一个目录
+
+目录结构：
+    session.json       - 文件列表、列名、处理步骤、选择的 X/Y 列和视图范围
+    f{k}/c{i}.npy      - 第 k 个文件的第 i 列（数值列为原始精度的浮点数组）
+    f{k}/c{i}_na.npy   - 非数值列的缺失值掩码（非数值列以字符串数组保存）
+    f{k}/mask{j}.npy   - 第 j 个删除点步骤的行位置
+
+打开会话时只读取 session.json，各列以内存映射方式打开，绘图用到时才由系统按页读入。
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+from data_store import ColumnStore
+from pipeline import MaskStep, make_step
+
+SESSION_VERSION = 1
+SESSION_FILE = 'session.json'
+SESSION_EXT = '.instplot'
+
+
+def is_session_dir(path):
+    return os.path.isfile(os.path.join(path, SESSION_FILE))
+
+
+def save_session(path, loaded_files, view):
+    """
+    保存会话到目录 path（已存在的会话会被整体替换）
+
+    path 已存在但不是会话目录（普通文件夹或文件）时抛出 ValueError，不会删除或覆盖它。
+
+    view 是可以直接写入 JSON 的视图状态，如 {'x_col': ..., 'y_col': ..., 'xlim': [...], 'ylim': [...]}。
+    先写到临时目录再改名，保存失败时不会破坏原有的会话。
+    """
+    path = os.path.abspath(path)
+    if os.path.exists(path) and not is_session_dir(path):
+        raise ValueError(f"{path} 已存在且不是会话目录，不能覆盖")
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        files = []
+        for k, lf in enumerate(loaded_files):
+            sub = f"f{k}"
+            os.makedirs(os.path.join(tmp, sub))
+            store = lf.store
+            for i, arr in store.iter_columns():
+                if store.numeric[i]:
+                    np.save(os.path.join(tmp, sub, f"c{i}.npy"), np.ascontiguousarray(arr))
+                else:
+                    missing = np.array([v is None or v != v for v in arr], dtype=bool)
+                    np.save(os.path.join(tmp, sub, f"c{i}.npy"), arr.astype(str))
+                    np.save(os.path.join(tmp, sub, f"c{i}_na.npy"), missing)
+            steps = []
+            for j, step in enumerate(lf.pipeline.steps):
+                entry = {'kind': step.kind, 'params': step.params()}
+                if isinstance(step, MaskStep):
+                    entry['rows'] = f"{sub}/mask{j}.npy"
+                    np.save(os.path.join(tmp, entry['rows']), step.rows)
+                steps.append(entry)
+            files.append({
+                'path': lf.path,
+                'dir': sub,
+                'columns': [str(c) for c in store.columns],
+                'numeric': list(store.numeric),
+                'n_rows': len(store),
+                'dtype': store.dtype.name,
+                'source': store.source,
+                'encoding': lf.encoding,
+                'sep': lf.sep,
+                'steps': steps,
+            })
+        meta = {'version': SESSION_VERSION, 'files': files, 'view': view}
+        with open(os.path.join(tmp, SESSION_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        if is_session_dir(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def _session_loader(folder, numeric):
+    """会话中列的读取函数：数值列直接返回只读内存映射，不复制数据"""
+    def load(i):
+        arr = np.load(os.path.join(folder, f"c{i}.npy"), mmap_mode='r', allow_pickle=False)
+        if numeric[i]:
+            return arr
+        missing = np.load(os.path.join(folder, f"c{i}_na.npy"), allow_pickle=False)
+        arr = np.asarray(arr).astype(object)
+        arr[missing] = np.nan
+        return arr
+    return load
+
+
+def load_session(path):
+    """
+    读取会话目录，返回 (文件列表, 视图状态)
+
+    文件列表中每项为 dict：path、store（ColumnStore）、steps（处理步骤列表）、encoding、sep。
+    """
+    with open(os.path.join(path, SESSION_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version', 0) > SESSION_VERSION:
+        raise ValueError("会话由更新版本的软件保存，无法打开")
+    files = []
+    for info in meta['files']:
+        folder = os.path.join(path, info['dir'])
+        numeric = info['numeric']
+        store = ColumnStore(info['columns'], numeric, info['n_rows'],
+                            _session_loader(folder, numeric), info['dtype'], info.get('source'))
+        steps = []
+        for entry in info['steps']:
+            step = make_step(entry['kind'], entry['params'])
+            if isinstance(step, MaskStep):
+                rows = np.load(os.path.join(path, entry['rows']), allow_pickle=False)
+                if len(rows):
+                    step.extend(rows)
+            steps.append(step)
+        files.append({'path': info['path'], 'store': store, 'steps': steps,
+                      'encoding': info.get('encoding'), 'sep': info.get('sep')})
+    return files, meta.get('view') or {}
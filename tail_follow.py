@@ -0,0 +1,117 @@
+# tail_follow.py
+"""跟随模式：仪器仍在写入的数据文件，每次只解析上次读取位置之后新追加的完整行"""
+
+import io
+import os
+import numpy as np
+import pandas as pd
+from data_loader import block_layout, insert_delimiters, FWF_DELIM
+
+# 默认的检查间隔（毫秒）
+DEFAULT_FOLLOW_MS = 1000
+# 支持跟随的文件格式（Excel 不是逐行写入的）
+FOLLOW_FORMATS = ('csv', 'fwf', 'vsm', 'qd')
+
+
+def can_follow(source):
+    """该读取方式的文件能否跟随：格式逐行写入，且不是压缩文件（无法从上次的位置继续解析）"""
+    return bool(source) and source.get('format') in FOLLOW_FORMATS and not source.get('compression')
+
+
+def find_data_end(path, source, n_rows):
+    """
+    找到已读取的 n_rows 行数据在文件中的结束位置，返回 (字节位置, 最后一行是否尚未写完)
+
+    跳过表头之前的行后按非空行计数（与读取时跳过空行一致）。最后一行没有换行符时说明仪器还没写完，
+    返回这一行的行首，之后读到完整的行时用它覆盖已读取的不完整数据。
+    """
+    skip = block_layout(source)[1] if source['format'] in ('vsm', 'qd') else source['header_row'] + 1
+    offset = 0
+    count = 0
+    with open(path, 'rb') as fh:
+        for i, line in enumerate(fh):
+            if i >= skip and line.strip():
+                if count == n_rows:
+                    return offset, False
+                count += 1
+                if count == n_rows and not line.endswith(b'\n'):
+                    return offset, True
+            offset += len(line)
+    return offset, False
+
+
+class FileFollower:
+    """记录一个文件已解析到的字节位置，poll() 只解析其后新追加的完整行"""
+
+    def __init__(self, path, source, numeric, offset, overlap=0):
+        self.path = path
+        self.source = source
+        self.numeric = list(numeric)
+        self.offset = offset
+        self.overlap = overlap  # 下一批新数据需要覆盖的已读取行数（最后一行未写完时为 1）
+
+    @classmethod
+    def start(cls, path, source, numeric, n_rows):
+        if not can_follow(source):
+            raise ValueError("该文件格式不支持跟随模式")
+        offset, partial = find_data_end(path, source, n_rows)
+        return cls(path, source, numeric, offset, overlap=1 if partial else 0)
+
+    def poll(self):
+        """
+        检查文件是否有新追加的完整行
+
+        有则返回 ({列位置: 数组}, 需要覆盖的末尾行数)，否则返回 None；文件变短（被截断或替换）时抛出 ValueError。
+        """
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            raise ValueError("文件被截断或替换")
+        if size == self.offset:
+            return None
+        with open(self.path, 'rb') as fh:
+            fh.seek(self.offset)
+            data = fh.read(size - self.offset)
+        # 只解析到最后一个换行符，未写完的行留到下次
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            return None
+        data = data[:cut + 1]
+        self.offset += len(data)
+        df = self._parse(data)
+        if df is None or not len(df):
+            return None
+
+        new = {}
+        for i, numeric in enumerate(self.numeric):
+            col = df.iloc[:, i]
+            if numeric:
+                new[i] = pd.to_numeric(col, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            else:
+                new[i] = col.to_numpy(dtype=object)
+        overlap, self.overlap = self.overlap, 0
+        return new, overlap
+
+    def _parse(self, data):
+        fmt = self.source['format']
+        usecols = None
+        if fmt in ('vsm', 'qd'):
+            sep, _, usecols = block_layout(self.source)
+        elif fmt == 'fwf' and 'cuts' in self.source:
+            # 按读取时推断的列边界插入分隔符
+            data = insert_delimiters(data, self.source['cuts'])
+            sep = FWF_DELIM
+        elif fmt == 'fwf':
+            # 旧版会话没有记录列边界：数值列之间都有空白，按空白分隔解析
+            sep = r'\s+'
+        else:
+            sep = self.source['sep']
+        try:
+            if usecols:
+                return pd.read_csv(io.BytesIO(data), sep=sep, header=None, usecols=usecols, engine='c')
+            return pd.read_csv(io.BytesIO(data), sep=sep, header=None, index_col=False,
+                               names=list(range(len(self.numeric))), skipinitialspace=True,
+                               encoding=self.source.get('encoding'), encoding_errors='replace',
+                               engine='c')
+        except pd.errors.EmptyDataError:
+            # 只追加了空行
+            return None